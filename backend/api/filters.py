@@ -1,10 +1,11 @@
-from django.contrib.auth import get_user_model
+from django import forms
+from django.db.models import F, FilteredRelation, Q
 from django_filters.rest_framework import FilterSet, filters
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Ingredient, Recipe, Tag
-
-User = get_user_model()
+from recipes.cache import get_tag_ids_by_slug
+from recipes.models import (FavoriteRecipe, Ingredient, PopularRecipe,
+                            Recipe, ShoppingCart)
 
 
 class IngredientSearchFilter(SearchFilter):
@@ -15,28 +16,71 @@ class IngredientSearchFilter(SearchFilter):
         fields = ('name',)
 
 
+class SlugListField(forms.MultipleChoiceField):
+
+    def valid_value(self, value):
+        return True
+
+
+class SlugListFilter(filters.MultipleChoiceFilter):
+    field_class = SlugListField
+
+
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        queryset=Tag.objects.all(),
-        to_field_name='slug',
-    )
-    author = filters.ModelChoiceFilter(queryset=User.objects.all())
+    tags = SlugListFilter(method='get_tags')
+    author = filters.NumberFilter(field_name='author_id')
     is_favorited = filters.NumberFilter(method='get_is_favorited')
     is_in_shopping_cart = filters.NumberFilter(
         method='get_is_in_shopping_cart'
     )
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'popular'),), method='get_ordering'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+            'ordering'
+        )
+
+    def get_tags(self, queryset, name, value):
+        tag_ids_by_slug = get_tag_ids_by_slug()
+        tag_ids = [
+            tag_ids_by_slug[slug] for slug in value
+            if slug in tag_ids_by_slug
+        ]
+        if not tag_ids:
+            return queryset.none()
+        return queryset.filter(pk__in=Recipe.tags.through.objects.filter(
+            tag_id__in=tag_ids
+        ).values('recipe_id'))
 
     def get_is_favorited(self, queryset, name, value):
         if value and not self.request.user.is_anonymous:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(pk__in=FavoriteRecipe.objects.filter(
+                user=self.request.user
+            ).values('recipe_id'))
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         if value and not self.request.user.is_anonymous:
-            return queryset.filter(list__user=self.request.user)
+            return queryset.filter(pk__in=ShoppingCart.objects.filter(
+                user=self.request.user
+            ).values('recipe_id'))
         return queryset
+
+    def get_ordering(self, queryset, name, value):
+        window = self.request.query_params.get('window')
+        if window not in dict(PopularRecipe.WINDOW_CHOICES):
+            window = PopularRecipe.WEEK
+        tags = self.form.cleaned_data.get('tags') or []
+        tag_id = None
+        if len(tags) == 1:
+            tag_id = get_tag_ids_by_slug().get(tags[0])
+        # Recipes outside the leaderboard follow it, newest first.
+        return queryset.annotate(board=FilteredRelation(
+            'popularity', condition=Q(
+                popularity__window=window, popularity__tag_id=tag_id
+            )
+        )).order_by(F('board__score').desc(nulls_last=True), '-pud_date')
@@ -0,0 +1,96 @@
+import time
+import tracemalloc
+from collections import OrderedDict
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnList
+
+from api.renderers import ORJSONParser, ORJSONRenderer
+
+
+def make_recipe_page(recipes, ingredients):
+    """Build data shaped like a RecipeReadSerializer list page."""
+    return OrderedDict([
+        ('count', 10000),
+        ('next', 'http://foodgram.ru/api/recipes/?page=3'),
+        ('previous', 'http://foodgram.ru/api/recipes/?page=1'),
+        ('results', ReturnList([
+            OrderedDict([
+                ('id', recipe_id),
+                ('tags', [
+                    OrderedDict([
+                        ('id', tag_id), ('name', f'Тэг {tag_id}'),
+                        ('color', '#E26C2D'), ('slug', f'tag{tag_id}'),
+                    ])
+                    for tag_id in range(3)
+                ]),
+                ('author', OrderedDict([
+                    ('email', f'author{recipe_id}@foodgram.ru'),
+                    ('id', recipe_id),
+                    ('username', f'author{recipe_id}'),
+                    ('first_name', 'Вася'),
+                    ('last_name', 'Пупкин'),
+                    ('is_subscribed', False),
+                ])),
+                ('ingredients', [
+                    OrderedDict([
+                        ('id', ingredient_id),
+                        ('name', f'Ингредиент {ingredient_id}'),
+                        ('measurement_unit', 'г'),
+                        ('amount', ingredient_id * 10),
+                    ])
+                    for ingredient_id in range(ingredients)
+                ]),
+                ('is_favorited', True),
+                ('is_in_shopping_cart', False),
+                ('name', f'Рецепт номер {recipe_id}'),
+                ('image', f'http://foodgram.ru/media/recipes/{recipe_id}.jpg'),
+                ('text', 'Описание рецепта. ' * 40),
+                ('cooking_time', 45),
+            ])
+            for recipe_id in range(recipes)
+        ], serializer=None)),
+    ])
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость и память JSON рендереров на странице рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100)
+        parser.add_argument('--ingredients', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def measure(self, function, repeat):
+        tracemalloc.start()
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        return (time.perf_counter() - start) / repeat * 1000, peak / 1024
+
+    def handle(self, *args, **options):
+        data = make_recipe_page(options['recipes'], options['ingredients'])
+        content = JSONRenderer().render(data)
+        if ORJSONRenderer().render(data) != content:
+            self.stderr.write(self.style.ERROR('Ответы рендереров отличаются'))
+        self.stdout.write(
+            f'Страница: {options["recipes"]} рецептов, '
+            f'{len(content) / 1024:.1f} КБ'
+        )
+        for name, function in (
+            ('JSONRenderer', lambda: JSONRenderer().render(data)),
+            ('ORJSONRenderer', lambda: ORJSONRenderer().render(data)),
+            ('JSONParser', lambda: JSONParser().parse(BytesIO(content))),
+            ('ORJSONParser',
+             lambda: ORJSONParser().parse(BytesIO(content))),
+        ):
+            milliseconds, kilobytes = self.measure(function, options['repeat'])
+            self.stdout.write(
+                f'{name:<16} {milliseconds:8.3f} мс  пик {kilobytes:8.1f} КБ'
+            )
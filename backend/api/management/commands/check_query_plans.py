@@ -0,0 +1,340 @@
+import json
+import os
+import re
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import FollowViewSet, RecipeViewSet
+from recipes.models import (FavoriteRecipe, FeedEntry, Ingredient,
+                            IngredientAmount, PopularRecipe, Recipe,
+                            ShoppingCart, Tag)
+from users.models import Follow, User
+
+SNAPSHOT_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+    'query_plans',
+)
+RECIPES = RecipeViewSet.as_view({'get': 'list'}, throttle_classes=())
+# (case, view, URL) of the requests whose queries are checked.
+CASES = (
+    ('recipes', RECIPES, '/api/recipes/'),
+    ('recipes_by_tag', RECIPES, '/api/recipes/?tags={tag}'),
+    ('recipes_by_author', RECIPES, '/api/recipes/?author={author}'),
+    ('recipes_favorited', RECIPES, '/api/recipes/?is_favorited=1'),
+    ('recipes_in_cart', RECIPES, '/api/recipes/?is_in_shopping_cart=1'),
+    ('recipes_popular', RECIPES, '/api/recipes/?ordering=popular'),
+    ('feed', RecipeViewSet.as_view(
+        {'get': 'feed'}, throttle_classes=()
+    ), '/api/recipes/feed/'),
+    ('shopping_cart', RecipeViewSet.as_view(
+        {'get': 'download_shopping_cart'}, throttle_classes=()
+    ), '/api/recipes/download_shopping_cart/'),
+    ('subscriptions', FollowViewSet.as_view(
+        {'get': 'subscriptions'}, throttle_classes=()
+    ), '/api/users/subscriptions/'),
+)
+SQLITE_ACCESS = re.compile(r'^(SCAN|SEARCH)(?: TABLE)? (\S+)(.*)$')
+SQLITE_INDEX = re.compile(r'USING (?:COVERING )?INDEX (\S+)')
+# Django's aliases of tables in subqueries (U0, T3 and so on).
+SQL_ALIAS = re.compile(r'^[A-Z]\d+$')
+
+
+def seed():
+    """Create a few rows of everything the checked requests read."""
+    key = uuid.uuid4().hex[:8]
+    users = [
+        User.objects.create(
+            email=f'plans{key}{i}@foodgram.ru', username=f'plans{key}{i}',
+            first_name='План', last_name='Запросов',
+        )
+        for i in range(4)
+    ]
+    viewer, authors = users[0], users[1:]
+    tags = [
+        Tag.objects.create(
+            name=f'plans{key}{i}', slug=f'plans{key}{i}',
+            color=f'#{key[:5]}{i}',
+        )
+        for i in range(2)
+    ]
+    ingredients = [
+        Ingredient.objects.create(
+            name=f'plans{key}{i}', measurement_unit='г'
+        )
+        for i in range(3)
+    ]
+    recipes = [
+        Recipe.objects.create(
+            author=author, name=f'plans{key}{i}', text='План',
+            cooking_time=10, image='image_recipes/plans.png',
+        )
+        for author in authors for i in range(3)
+    ]
+    IngredientAmount.objects.bulk_create(
+        IngredientAmount(recipe=recipe, ingredient=ingredient, amount=100)
+        for recipe in recipes for ingredient in ingredients
+    )
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe=recipe, tag=tags[i % 2])
+        for i, recipe in enumerate(recipes)
+    )
+    FavoriteRecipe.objects.bulk_create(
+        FavoriteRecipe(user=viewer, recipe=recipe) for recipe in recipes[::2]
+    )
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user=viewer, recipe=recipe) for recipe in recipes[1::2]
+    )
+    Follow.objects.bulk_create(
+        Follow(user=viewer, author=author) for author in authors
+    )
+    FeedEntry.objects.bulk_create(
+        FeedEntry(user=viewer, recipe=recipe, author=recipe.author,
+                  pub_date=recipe.pud_date)
+        for recipe in recipes
+    )
+    PopularRecipe.objects.bulk_create(
+        PopularRecipe(window=PopularRecipe.WEEK, recipe=recipe, score=i)
+        for i, recipe in enumerate(recipes)
+    )
+    return viewer, {'tag': tags[0].slug, 'author': authors[0].pk}
+
+
+# Nodes that read all of their input before returning a row: below them
+# a Limit no longer bounds how much is read.
+BLOCKING_NODES = {
+    'Aggregate', 'Group', 'Hash', 'Incremental Sort', 'Materialize',
+    'SetOp', 'Sort', 'WindowAgg',
+}
+INDEX_SCANS = {'Index Scan', 'Index Only Scan'}
+PLANNER_SETTINGS = ('enable_seqscan', 'enable_mergejoin', 'enable_hashjoin')
+
+
+def explain_postgresql(cursor, sql, params):
+    """Plan lines, tables read whole and tables probed for every row.
+
+    A table is read whole by a sequential scan, and by an index scan
+    without a condition that no Limit stops early. A correlated SubPlan
+    outside such a Limit runs for every row of its parent.
+    """
+    cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    lines, full_scans, per_row = [], set(), set()
+
+    def relations(node):
+        if 'Relation Name' in node:
+            yield node['Relation Name']
+        for child in node.get('Plans', ()):
+            yield from relations(child)
+
+    def walk(node, depth, bounded):
+        line = node['Node Type']
+        if 'Index Name' in node:
+            line += f' using {node["Index Name"]}'
+        if 'Relation Name' in node:
+            line += f' on {node["Relation Name"]}'
+            unbounded_index_scan = (
+                node['Node Type'] in INDEX_SCANS
+                and 'Index Cond' not in node
+                and not bounded
+            )
+            if node['Node Type'] == 'Seq Scan' or unbounded_index_scan:
+                full_scans.add(node['Relation Name'])
+        lines.append('  ' * depth + line)
+        if node['Node Type'] == 'Limit':
+            bounded = True
+        elif node['Node Type'] in BLOCKING_NODES:
+            bounded = False
+        for child in node.get('Plans', ()):
+            if child.get('Parent Relationship') == 'SubPlan' and not bounded:
+                per_row.update(relations(child))
+            walk(child, depth + 1, bounded)
+
+    walk(plan[0]['Plan'], 0, False)
+    return lines, full_scans, per_row
+
+
+def explain_sqlite(cursor, sql, params):
+    """Plan lines, tables read whole and tables probed for every row.
+
+    SQLite shows no Limit node: a statement is taken as bounded when it
+    has a LIMIT and sorts no rows in a temporary B-tree.
+    """
+    cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+    rows = cursor.fetchall()
+    bounded = ' LIMIT ' in sql.upper() and not any(
+        detail.startswith('USE TEMP B-TREE') for *_, detail in rows
+    )
+    lines, full_scans, per_row, subqueries = [], set(), set(), set()
+    depths, correlated = {0: -1}, set()
+
+    def table_name(name, access):
+        # Subqueries name tables by alias; the index tells the table.
+        index = SQLITE_INDEX.search(access)
+        if not SQL_ALIAS.match(name) or index is None:
+            return name
+        cursor.execute(
+            'SELECT tbl_name FROM sqlite_master WHERE name = %s', [index[1]]
+        )
+        row = cursor.fetchone()
+        return row[0] if row else name
+
+    for node_id, parent, _, detail in rows:
+        depths[node_id] = depths.get(parent, -1) + 1
+        lines.append('  ' * depths[node_id] + detail)
+        if parent in correlated or detail.startswith('CORRELATED '):
+            correlated.add(node_id)
+        if detail.startswith(('CO-ROUTINE ', 'MATERIALIZE ')):
+            subqueries.add(detail.split()[1])
+        match = SQLITE_ACCESS.match(detail)
+        if not match:
+            continue
+        table = table_name(match[2], match[3])
+        if parent in correlated and not bounded:
+            per_row.add(table)
+        if match[1] == 'SCAN' and (
+            'USING' not in match[3] or not bounded
+        ):
+            full_scans.add(table)
+    # Reading the rows of a subquery is not a scan of a table.
+    return lines, full_scans - subqueries, per_row - subqueries
+
+
+EXPLAIN = {
+    'postgresql': explain_postgresql,
+    'sqlite': explain_sqlite,
+}
+
+
+class QueryRecorder:
+    """execute_wrapper that keeps the SELECT statements it sees."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет планы запросов ленты, фильтров рецептов, подписок '
+        'и списка покупок: падает, если таблица стала читаться целиком '
+        'или подзапрос стал выполняться для каждой строки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--update', action='store_true',
+            help='Перезаписать сохранённые планы текущими',
+        )
+
+    def handle(self, *args, **options):
+        explain = EXPLAIN.get(connection.vendor)
+        if explain is None:
+            raise CommandError(
+                f'Планы для базы {connection.vendor} не поддерживаются'
+            )
+        path = os.path.join(SNAPSHOT_DIR, f'{connection.vendor}.json')
+        plans = self.collect_plans(explain)
+        if options['update']:
+            os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as snapshot:
+                json.dump(plans, snapshot, ensure_ascii=False, indent=2)
+                snapshot.write('\n')
+            self.stdout.write(self.style.SUCCESS(f'Планы сохранены в {path}'))
+            return
+        if not os.path.exists(path):
+            raise CommandError(
+                f'Нет сохранённых планов {path}, запустите с --update'
+            )
+        with open(path, encoding='utf-8') as snapshot:
+            expected = json.load(snapshot)
+        regressions = 0
+        for case, plan in plans.items():
+            old = expected.get(case)
+            if old is None:
+                self.stdout.write(f'{case}: нет сохранённого плана')
+                continue
+            new_scans = set(plan['full_scans']) - set(old['full_scans'])
+            new_per_row = set(plan['per_row']) - set(old.get('per_row', ()))
+            if new_scans or new_per_row:
+                regressions += 1
+                if new_scans:
+                    self.stderr.write(
+                        f'{case}: полный просмотр '
+                        f'{", ".join(sorted(new_scans))}'
+                    )
+                if new_per_row:
+                    self.stderr.write(
+                        f'{case}: подзапрос на каждую строку к '
+                        f'{", ".join(sorted(new_per_row))}'
+                    )
+                self.stderr.write(self.format_plan(plan))
+            elif plan['queries'] != old['queries']:
+                self.stdout.write(self.style.WARNING(
+                    f'{case}: план изменился, полных просмотров не добавилось'
+                ))
+                self.stdout.write(self.format_plan(plan))
+            else:
+                self.stdout.write(f'{case}: без изменений')
+        if regressions:
+            raise CommandError(f'Планов с регрессиями: {regressions}')
+        self.stdout.write(self.style.SUCCESS('Планы в порядке'))
+
+    @staticmethod
+    def format_plan(plan):
+        return '\n\n'.join(
+            '\n'.join('    ' + line for line in lines)
+            for lines in plan['queries']
+        )
+
+    def collect_plans(self, explain):
+        factory = APIRequestFactory()
+        plans = {}
+        # An empty cache makes every run issue the same queries.
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'check-query-plans',
+        }}), transaction.atomic():
+            viewer, values = seed()
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    # Seeded tables are tiny, and the planner would read
+                    # them whole anyway. With sequential scans, merge and
+                    # hash joins discouraged a table is only read whole
+                    # when no index can serve the query.
+                    for setting in PLANNER_SETTINGS:
+                        cursor.execute(f'SET LOCAL {setting} = off')
+                for case, view, url in CASES:
+                    request = factory.get(url.format(**values))
+                    force_authenticate(request, viewer)
+                    recorder = QueryRecorder()
+                    with connection.execute_wrapper(recorder):
+                        response = view(request)
+                        if hasattr(response, 'render'):
+                            response.render()
+                    if response.status_code != 200:
+                        raise CommandError(
+                            f'{case}: ответ {response.status_code}'
+                        )
+                    queries, full_scans, per_row = [], set(), set()
+                    for sql, params in recorder.queries:
+                        lines, scans, probes = explain(cursor, sql, params)
+                        queries.append(lines)
+                        full_scans |= scans
+                        per_row |= probes
+                    plans[case] = {
+                        'queries': queries,
+                        'full_scans': sorted(full_scans),
+                        'per_row': sorted(per_row),
+                    }
+            transaction.set_rollback(True)
+        return plans
@@ -0,0 +1,66 @@
+import json
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.queries import can_build_recipe_documents, get_recipe_document
+from api.serializers import RecipeReadSerializer
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
+from users.models import Follow, User
+
+
+def normalize(document):
+    document = json.loads(json.dumps(document))
+    # The serializer doesn't order ingredients.
+    document['ingredients'].sort(key=lambda ingredient: ingredient['id'])
+    return document
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает рецепты, собранные запросом к PostgreSQL, '
+        'с выводом RecipeReadSerializer'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100)
+        parser.add_argument('--users', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if not can_build_recipe_documents():
+            raise CommandError(
+                'Сборка рецептов в базе выключена или база не PostgreSQL'
+            )
+        user_ids = set(
+            FavoriteRecipe.objects.values_list('user', flat=True)
+            [:options['users']]
+        ) | set(
+            ShoppingCart.objects.values_list('user', flat=True)
+            [:options['users']]
+        ) | set(
+            Follow.objects.values_list('user', flat=True)[:options['users']]
+        )
+        users = [AnonymousUser(), *User.objects.filter(id__in=user_ids)]
+        recipes = Recipe.objects.order_by('-id')[:options['recipes']]
+        factory = APIRequestFactory()
+        mismatches = checked = 0
+        for recipe in recipes:
+            for user in users:
+                request = Request(factory.get(f'/api/recipes/{recipe.id}/'))
+                request.user = user
+                expected = normalize(RecipeReadSerializer(
+                    recipe, context={'request': request}
+                ).data)
+                actual = normalize(get_recipe_document(recipe.id, request))
+                checked += 1
+                if actual != expected:
+                    mismatches += 1
+                    self.stderr.write(
+                        f'Рецепт {recipe.id}, пользователь {user.id}:\n'
+                        f'  сериализатор: {expected}\n  SQL: {actual}'
+                    )
+        if mismatches:
+            raise CommandError(f'Расхождений: {mismatches} из {checked}')
+        self.stdout.write(self.style.SUCCESS(f'Совпадают все {checked}'))
@@ -0,0 +1,53 @@
+import os
+import pstats
+from io import StringIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Сводка по профилям запросов: самые дорогие функции каждого view'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--view', default='',
+            help='Показать только view, в имени которых есть эта строка',
+        )
+        parser.add_argument(
+            '--limit', type=int, default=15,
+            help='Сколько функций показать для каждого view',
+        )
+        parser.add_argument(
+            '--sort', default='cumulative',
+            choices=('cumulative', 'tottime', 'calls'),
+            help='Порядок сортировки функций',
+        )
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(settings.PROFILE_DIR):
+            self.stdout.write('Профилей пока нет')
+            return
+        for entry in sorted(os.scandir(settings.PROFILE_DIR),
+                            key=lambda entry: entry.name):
+            if not entry.is_dir() or options['view'] not in entry.name:
+                continue
+            files = [
+                item.path for item in os.scandir(entry.path)
+                if item.name.endswith('.prof')
+            ]
+            if not files:
+                continue
+            # OutputWrapper ends every write() with a newline, while
+            # pstats prints lines piece by piece.
+            output = StringIO()
+            stats = pstats.Stats(*files, stream=output)
+            self.stdout.write(self.style.SUCCESS(
+                f'{entry.name}: запросов {len(files)}, '
+                f'в среднем {stats.total_tt / len(files) * 1000:.1f} мс'
+            ))
+            # Skip the header that lists every profile file.
+            stats.files = []
+            stats.strip_dirs().sort_stats(options['sort'])
+            stats.print_stats(options['limit'])
+            self.stdout.write(output.getvalue())
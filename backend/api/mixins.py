@@ -1,7 +1,117 @@
+import time
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from rest_framework import mixins, viewsets
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+
+from .renderers import NDJSONRenderer
+from foodgram.metrics import SERIALIZER_TIME
 
 
 class ListRetrieveViewSet(
     viewsets.GenericViewSet, mixins.ListModelMixin, mixins.RetrieveModelMixin
 ):
     pass
+
+
+class NDJSONListMixin:
+    """Streams the whole list with ``?format=ndjson`` instead of a page.
+
+    Rows are read by primary key in chunks of NDJSON_CHUNK_SIZE and
+    written one per line as they are serialized, so memory use doesn't
+    grow with the size of the list.
+    """
+
+    renderer_classes = (
+        *api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer
+    )
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != NDJSONRenderer.format:
+            return super().list(request, *args, **kwargs)
+        return StreamingHttpResponse(
+            self.stream_rows(self.filter_queryset(self.get_queryset())),
+            content_type=NDJSONRenderer.media_type,
+        )
+
+    def prepare_rows(self, rows):
+        """Hook to load data for a chunk of rows before they are written."""
+
+    def stream_rows(self, queryset):
+        serializer = self.get_serializer()
+        renderer = NDJSONRenderer()
+        queryset = queryset.order_by('pk')
+        chunk = queryset
+        while True:
+            rows = list(chunk[:settings.NDJSON_CHUNK_SIZE])
+            if not rows:
+                return
+            self.prepare_rows(rows)
+            for row in rows:
+                yield renderer.render(serializer.to_representation(row))
+            chunk = queryset.filter(pk__gt=rows[-1].pk)
+
+
+class SparseFieldsSerializerMixin:
+    """Serializer that renders only the given ``fields`` except ``omit``."""
+
+    def __init__(self, *args, fields=None, omit=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in omit or ():
+            self.fields.pop(name, None)
+
+
+class TimedSerializerMixin:
+    """Records how long every object takes to serialize."""
+
+    def to_representation(self, instance):
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            SERIALIZER_TIME.labels(type(self).__name__).observe(
+                time.perf_counter() - start
+            )
+
+
+class SparseFieldsMixin:
+    """Reads ``?fields=`` and ``?omit=`` for the read serializer.
+
+    Views use get_requested_fields() to load only the columns and
+    relations that will be rendered.
+    """
+
+    fields_query_param = 'fields'
+    omit_query_param = 'omit'
+
+    def get_query_param_list(self, name):
+        return {
+            value
+            for param in self.request.query_params.getlist(name)
+            for value in param.split(',') if value
+        }
+
+    def get_requested_fields(self, serializer_class=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        fields = serializer_class.Meta.fields
+        if self.fields_query_param in self.request.query_params:
+            requested = self.get_query_param_list(self.fields_query_param)
+            fields = [name for name in fields if name in requested]
+        omitted = self.get_query_param_list(self.omit_query_param)
+        return [name for name in fields if name not in omitted]
+
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        if (
+            self.request.method in SAFE_METHODS
+            and issubclass(serializer_class, SparseFieldsSerializerMixin)
+        ):
+            kwargs.setdefault(
+                'fields', self.get_requested_fields(serializer_class)
+            )
+        return super().get_serializer(*args, **kwargs)
@@ -1,5 +1,83 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.paginator import Paginator
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class PlainCountPaginator(Paginator):
+    """Paginator that counts only the primary keys of a queryset.
+
+    Per-user flags are annotated as correlated EXISTS subqueries; Django
+    2.2 keeps them inside the COUNT(*) subquery and evaluates them for
+    every row, while values('pk') leaves them out.
+    """
+
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, 'values'):
+            return self.object_list.order_by().values('pk').count()
+        return super().count
 
 
 class LimitPageNumberPagination(PageNumberPagination):
+    django_paginator_class = PlainCountPaginator
     page_size_query_param = 'limit'
+    # Whole lists are streamed with ?format=ndjson instead.
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """Pages over a (date, id) position instead of an offset."""
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    invalid_cursor_message = 'Неверный курсор'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+        if page_size < 1:
+            return api_settings.PAGE_SIZE
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            date, pk = urlsafe_b64decode(
+                encoded.encode()
+            ).decode().split('|')
+            position = parse_datetime(date), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, request, position):
+        date, pk = position
+        encoded = urlsafe_b64encode(
+            f'{date.isoformat()}|{pk}'.encode()
+        ).decode()
+        return replace_query_param(
+            request.build_absolute_uri(), self.cursor_query_param, encoded
+        )
+
+    def get_paginated_response(self, request, data, next_position):
+        return Response({
+            'next': (
+                self.encode_cursor(request, next_position)
+                if next_position is not None else None
+            ),
+            'results': data,
+        })
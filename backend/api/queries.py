@@ -0,0 +1,105 @@
+import json
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, router
+
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
+from users.models import Follow, User
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Builds the RecipeReadSerializer document in the database, in one
+# statement. Keep it in sync with the serializer; the
+# check_recipe_documents command compares the two.
+RECIPE_DOCUMENT_SQL = '''
+SELECT json_build_object(
+    'id', recipe.id,
+    'tags', COALESCE((
+        SELECT json_agg(json_build_object(
+            'id', tag.id,
+            'name', tag.name,
+            'color', tag.color,
+            'slug', tag.slug
+        ) ORDER BY tag.id DESC)
+        FROM {recipe_tags} recipe_tag
+        JOIN {tag} tag ON tag.id = recipe_tag.tag_id
+        WHERE recipe_tag.recipe_id = recipe.id
+    ), '[]'::json),
+    'author', json_build_object(
+        'email', author.email,
+        'id', author.id,
+        'username', author.username,
+        'first_name', author.first_name,
+        'last_name', author.last_name,
+        'is_subscribed', EXISTS(
+            SELECT 1 FROM {follow} follow
+            WHERE follow.author_id = author.id AND follow.user_id = %(user)s
+        )
+    ),
+    'ingredients', COALESCE((
+        SELECT json_agg(json_build_object(
+            'id', ingredient.id,
+            'name', ingredient.name,
+            'measurement_unit', ingredient.measurement_unit,
+            'amount', amount.amount
+        ) ORDER BY amount.id)
+        FROM {ingredient_amount} amount
+        JOIN {ingredient} ingredient ON ingredient.id = amount.ingredient_id
+        WHERE amount.recipe_id = recipe.id
+    ), '[]'::json),
+    'is_favorited', EXISTS(
+        SELECT 1 FROM {favorite} favorite
+        WHERE favorite.recipe_id = recipe.id AND favorite.user_id = %(user)s
+    ),
+    'is_in_shopping_cart', EXISTS(
+        SELECT 1 FROM {shopping_cart} cart
+        WHERE cart.recipe_id = recipe.id AND cart.user_id = %(user)s
+    ),
+    'name', recipe.name,
+    'image', recipe.image,
+    'text', recipe.text,
+    'cooking_time', recipe.cooking_time
+)::text
+FROM {recipe} recipe
+JOIN {user} author ON author.id = recipe.author_id
+WHERE recipe.id = %(recipe)s AND recipe.deleted_at IS NULL
+'''.format(
+    recipe=Recipe._meta.db_table,
+    recipe_tags=Recipe.tags.through._meta.db_table,
+    tag=Recipe.tags.field.related_model._meta.db_table,
+    ingredient_amount=Recipe.ingredients.through._meta.db_table,
+    ingredient=Recipe.ingredients.field.related_model._meta.db_table,
+    follow=Follow._meta.db_table,
+    favorite=FavoriteRecipe._meta.db_table,
+    shopping_cart=ShoppingCart._meta.db_table,
+    user=User._meta.db_table,
+)
+
+
+def can_build_recipe_documents():
+    """Whether the database that recipes are read from can run the SQL."""
+    if not settings.RECIPE_DOCUMENT_SQL:
+        return False
+    return connections[router.db_for_read(Recipe)].vendor == 'postgresql'
+
+
+def get_recipe_document(recipe_id, request):
+    """Return the recipe as RecipeReadSerializer renders it, or None."""
+    user = request.user
+    with connections[router.db_for_read(Recipe)].cursor() as cursor:
+        cursor.execute(RECIPE_DOCUMENT_SQL, {
+            'recipe': recipe_id,
+            'user': user.id if user.is_authenticated else None,
+        })
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    document = orjson.loads(row[0]) if orjson else json.loads(row[0])
+    document['image'] = request.build_absolute_uri(
+        default_storage.url(document['image'])
+    ) if document['image'] else None
+    return document
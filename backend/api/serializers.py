@@ -1,9 +1,15 @@
+from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
 
+from .mixins import SparseFieldsSerializerMixin, TimedSerializerMixin
+from jobs.queue import enqueue
+from recipes.fingerprint import recipe_fingerprint
+from recipes.ingredient_index import mark_ingredient_index_changed
 from recipes.models import (
     FavoriteRecipe, Ingredient, IngredientAmount,
     Recipe, ShoppingCart, Tag
@@ -26,7 +32,9 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         fields = '__all__'
 
 
-class UserSubcribedSerializer(UserSerializer):
+class UserSubcribedSerializer(
+    TimedSerializerMixin, SparseFieldsSerializerMixin, UserSerializer
+):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -40,7 +48,9 @@ class UserSubcribedSerializer(UserSerializer):
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
-        return Follow.objects.filter(author=obj.id).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return Follow.objects.filter(user=user, author=obj.id).exists()
 
 
 class CheckFollowSerializer(serializers.ModelSerializer):
@@ -94,6 +104,9 @@ class FollowSerializer(UserSubcribedSerializer):
             'is_subscribed', 'recipes', 'recipes_count'
         )
 
+    def get_is_subscribed(self, obj):
+        return True
+
     def get_recipes(self, obj):
         request = self.context.get('request')
         limit = request.GET.get('recipes_limit')
@@ -103,6 +116,8 @@ class FollowSerializer(UserSubcribedSerializer):
         return ShortRecipeSerializer(queryset, many=True).data
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return Recipe.objects.filter(author=obj.author).count()
 
 
@@ -138,7 +153,7 @@ class IngredientAmountSerializer(serializers.ModelSerializer):
         ]
 
 
-class ShortRecipeSerializer(serializers.ModelSerializer):
+class ShortRecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
@@ -146,7 +161,10 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
         read_only_fields = '__all__',
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(
+    TimedSerializerMixin, SparseFieldsSerializerMixin,
+    serializers.ModelSerializer
+):
     image = Base64ImageField(max_length=None, use_url=True)
     tags = TagSerializer(read_only=True, many=True)
     author = UserSubcribedSerializer(read_only=True)
@@ -167,16 +185,25 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('is_favorited', 'is_shopping_cart',)
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return Recipe.objects.filter(favorites__user=user, id=obj.id).exists()
 
     def get_is_in_shopping_cart(self, obj):
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return Recipe.objects.filter(list__user=user, id=obj.id).exists()
 
 
@@ -226,6 +253,21 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'У рецепта должен быть хотя бы один тег'
             )
+        fingerprint = recipe_fingerprint(
+            data.get('name', getattr(self.instance, 'name', '')),
+            [(item['id'], int(item['amount'])) for item in ingredients]
+        )
+        duplicates = Recipe.objects.filter(
+            author=self.context['request'].user, **fingerprint
+        )
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        duplicate = duplicates.values_list('id', flat=True).first()
+        if duplicate is not None:
+            raise serializers.ValidationError(
+                f'Такой рецепт у вас уже есть (id {duplicate})'
+            )
+        data.update(fingerprint)
         return data
 
     def validate_cooking_time(self, time):
@@ -250,6 +292,11 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(image=image, **validated_data)
         self.__create_ingredients(ingredients_data, recipe)
         recipe.tags.set(tags_data)
+        enqueue(
+            'recipes.update_similar_recipes', {'recipe_id': recipe.id},
+            dedup_key=str(recipe.id)
+        )
+        transaction.on_commit(mark_ingredient_index_changed)
         return recipe
 
     def update(self, recipe, validated_data):
@@ -257,10 +304,22 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             ingredients = validated_data.pop('ingredients')
             recipe.ingredients.clear()
             self.__create_ingredients(ingredients, recipe)
+            enqueue(
+                'recipes.update_similar_recipes', {'recipe_id': recipe.id},
+                dedup_key=str(recipe.id)
+            )
         if 'tags' in validated_data:
             tags_data = validated_data.pop('tags')
             recipe.tags.set(tags_data)
-        return super().update(recipe, validated_data)
+        transaction.on_commit(mark_ingredient_index_changed)
+        old_image = recipe.image.name
+        recipe = super().update(recipe, validated_data)
+        if recipe.image.name != old_image:
+            enqueue(
+                'recipes.release_image', {'name': old_image},
+                dedup_key=old_image, delay=settings.MEDIA_GC_GRACE_SECONDS
+            )
+        return recipe
 
     def to_representation(self, instance):
         context = self.context
@@ -0,0 +1,23 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+
+from api.management.commands.check_query_plans import EXPLAIN
+
+
+@skipUnless(
+    connection.vendor in EXPLAIN, 'Планы для этой базы не сохраняются'
+)
+class QueryPlansTest(TestCase):
+    """Plans of the checked requests match the saved snapshot."""
+
+    def test_no_new_full_scans(self):
+        stdout, stderr = StringIO(), StringIO()
+        try:
+            call_command('check_query_plans', stdout=stdout, stderr=stderr)
+        except CommandError as error:
+            self.fail(f'{error}\n{stderr.getvalue()}')
@@ -0,0 +1,78 @@
+from unittest import skipUnless
+
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.management.commands.check_recipe_documents import normalize
+from api.queries import get_recipe_document
+from api.serializers import RecipeReadSerializer
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientAmount,
+                            Recipe, ShoppingCart, Tag)
+from users.models import Follow, User
+
+
+@skipUnless(
+    connection.vendor == 'postgresql', 'Рецепты собирает только PostgreSQL'
+)
+@override_settings(RECIPE_DOCUMENT_SQL=True)
+class RecipeDocumentTest(TestCase):
+    """The SQL document of a recipe matches RecipeReadSerializer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer, author, other = (
+            User.objects.create(
+                email=f'{name}@foodgram.ru', username=name,
+                first_name=name.title(), last_name='Рецептов',
+            )
+            for name in ('viewer', 'author', 'other')
+        )
+        tags = [
+            Tag.objects.create(
+                name=f'Тэг {i}', slug=f'tag{i}', color=f'#00000{i}'
+            )
+            for i in range(2)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г'
+            )
+            for i in range(3)
+        ]
+        cls.recipes = []
+        for i, recipe_author in enumerate((author, author, other)):
+            recipe = Recipe.objects.create(
+                author=recipe_author, name=f'Рецепт {i}', text='Текст',
+                cooking_time=10 + i, image=f'image_recipes/{i}.png',
+            )
+            recipe.tags.set(tags[:i + 1])
+            IngredientAmount.objects.bulk_create(
+                IngredientAmount(
+                    recipe=recipe, ingredient=ingredient, amount=100 + i
+                )
+                for ingredient in ingredients[i:]
+            )
+            cls.recipes.append(recipe)
+        FavoriteRecipe.objects.create(user=cls.viewer, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.viewer, recipe=cls.recipes[1])
+        ShoppingCart.objects.create(user=cls.viewer, recipe=cls.recipes[2])
+        Follow.objects.create(user=cls.viewer, author=author)
+
+    def test_matches_serializer(self):
+        factory = APIRequestFactory()
+        for user in (AnonymousUser(), self.viewer):
+            for recipe in self.recipes:
+                with self.subTest(user=user.id, recipe=recipe.name):
+                    request = Request(
+                        factory.get(f'/api/recipes/{recipe.id}/')
+                    )
+                    request.user = user
+                    self.assertEqual(
+                        normalize(get_recipe_document(recipe.id, request)),
+                        normalize(RecipeReadSerializer(
+                            recipe, context={'request': request}
+                        ).data),
+                    )
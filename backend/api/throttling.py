@@ -0,0 +1,83 @@
+import time
+
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Token bucket kept in the cache: one get and one set per request.
+
+    Like ScopedRateThrottle it only limits views with a throttle_scope.
+    The rate "N/period" is both the bucket size and the refill speed, so a
+    client may burst N requests and then gets one every period / N.
+    Concurrent requests can race between get and set; the limit is
+    approximate, which is fine against a scraper. Buckets are shared by
+    the workers only when the cache is (memcached in docker-compose);
+    with LocMemCache every process keeps its own.
+    """
+
+    cache = cache
+    rate_suffix = ''
+    wait_time = None
+
+    def get_rate(self, scope):
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        return rates.get(scope + self.rate_suffix)
+
+    @staticmethod
+    def parse_rate(rate):
+        num, period = rate.split('/')
+        return int(num), DURATIONS[period[0]]
+
+    def get_cache_key(self, request, view, scope):
+        raise NotImplementedError('.get_cache_key() must be overridden')
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        rate = scope and self.get_rate(scope)
+        if not rate:
+            return True
+        key = self.get_cache_key(request, view, scope)
+        if key is None:
+            return True
+        capacity, duration = self.parse_rate(rate)
+        refill = capacity / duration
+        now = time.time()
+        tokens, updated = self.cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        else:
+            self.wait_time = (1 - tokens) / refill
+        self.cache.set(key, (tokens, now), duration)
+        return allowed
+
+    def wait(self):
+        return self.wait_time
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Bucket per user; anonymous clients get one per IP address."""
+
+    def get_cache_key(self, request, view, scope):
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        return f'throttle:{scope}:{ident}'
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """Bucket per IP address with its own, usually larger, rate.
+
+    It caps clients that spread requests over many accounts.
+    """
+
+    rate_suffix = '_ip'
+
+    def get_cache_key(self, request, view, scope):
+        return f'throttle:{scope}_ip:{self.get_ident(request)}'
@@ -1,7 +1,8 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import FollowViewSet, IngredientViewSet, RecipeViewSet, TagViewSet
+from .views import (BatchView, FollowViewSet, IngredientViewSet,
+                    RecipeViewSet, TagViewSet)
 
 app_name = 'api'
 
@@ -13,6 +14,7 @@ router.register('recipes', RecipeViewSet, basename='recipes')
 
 
 urlpatterns = [
+    path('batch/', BatchView.as_view(), name='batch'),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
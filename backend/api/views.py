@@ -1,22 +1,43 @@
-from django.db.models import Sum
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.db.models import Count, Exists, OuterRef, Prefetch, Q, Sum
+from django.http import Http404
 from django.shortcuts import HttpResponse, get_object_or_404
+from django.urls import Resolver404, resolve
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from .filters import IngredientSearchFilter, RecipeFilter
-from .mixins import ListRetrieveViewSet
-from .pagination import LimitPageNumberPagination
+from .mixins import ListRetrieveViewSet, NDJSONListMixin, SparseFieldsMixin
+from .pagination import KeysetPagination, LimitPageNumberPagination
 from .permissions import IsAdminOrReadOnly, OwnerOrReadOnly
+from .queries import can_build_recipe_documents, get_recipe_document
 from .serializers import (FollowSerializer, IngredientSerializer,
                           RecipeCreateSerializer, RecipeReadSerializer,
                           ShortRecipeSerializer, TagSerializer,
                           UserSubcribedSerializer)
+from foodgram.routers import get_read_from_replica, set_read_from_replica
+from jobs.queue import enqueue
+from recipes.cache import get_tag_ids_by_slug
+from recipes.feed import get_feed_page, remove_from_feed
+from recipes.ingredient_index import get_ingredient_index
 from recipes.models import (FavoriteRecipe, Ingredient, IngredientAmount,
                             Recipe, ShoppingCart, Tag)
+from recipes.purge import soft_delete_recipe, soft_delete_user
+from recipes.snapshot import get_ingredient_snapshot
+from recipes.stats import get_author_stats
 from users.models import Follow, User
 
 
@@ -27,30 +48,147 @@ class TagViewSet(ListRetrieveViewSet):
     permission_classes = (AllowAny,)
 
 
-class IngredientViewSet(ListRetrieveViewSet):
+class IngredientViewSet(NDJSONListMixin, ListRetrieveViewSet):
     queryset = Ingredient.objects.all()
     permission_classes = (IsAdminOrReadOnly,)
     serializer_class = IngredientSerializer
     pagination_class = None
     filter_backends = [IngredientSearchFilter]
     search_fields = ('^name',)
+    throttle_scope = None
+
+    def get_throttles(self):
+        if (
+            self.action == 'list'
+            and not self.request.query_params.get(
+                IngredientSearchFilter.search_param
+            )
+        ):
+            self.throttle_scope = 'ingredient_list'
+        return super().get_throttles()
+
+    @action(detail=False, methods=['get'])
+    def version(self, request):
+        snapshot = get_ingredient_snapshot()
+        if snapshot is None:
+            return Response(
+                {'errors': 'Список ингредиентов ещё не опубликован'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(snapshot)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    NDJSONListMixin, SparseFieldsMixin, viewsets.ModelViewSet
+):
     permission_classes = (OwnerOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filter_class = RecipeFilter
     queryset = Recipe.objects.all()
     pagination_class = LimitPageNumberPagination
+    throttle_scope = None
+    field_columns = {
+        'id': 'id',
+        'author': 'author',
+        'name': 'name',
+        'image': 'image',
+        'text': 'text',
+        'cooking_time': 'cooking_time',
+    }
+
+    def get_throttles(self):
+        if self.action == 'create':
+            self.throttle_scope = 'recipe_create'
+        return super().get_throttles()
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeReadSerializer
         return RecipeCreateSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        fields = self.get_requested_fields(RecipeReadSerializer)
+        queryset = queryset.only('id', *(
+            self.field_columns[name] for name in fields
+            if name in self.field_columns
+        ))
+        if 'tags' in fields:
+            queryset = queryset.prefetch_related('tags')
+        if 'ingredients' in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipe_ingredient',
+                IngredientAmount.objects.select_related('ingredient'),
+            ))
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+        return queryset
+
+    def set_user_flags(self, recipes):
+        """Set the current user's flags on a page of recipes.
+
+        One query per flag for the whole page: annotated as correlated
+        subqueries they were evaluated for every matching row, before
+        the page was cut.
+        """
+        user = self.request.user
+        if not user.is_authenticated or not recipes:
+            return
+        fields = self.get_requested_fields(RecipeReadSerializer)
+        recipe_ids = [recipe.pk for recipe in recipes]
+        flags = (
+            ('is_favorited', FavoriteRecipe),
+            ('is_in_shopping_cart', ShoppingCart),
+        )
+        for name, model in flags:
+            if name not in fields:
+                continue
+            marked = set(model.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True))
+            for recipe in recipes:
+                setattr(recipe, name, recipe.pk in marked)
+        if 'author' in fields:
+            followed = set(Follow.objects.filter(
+                user=user,
+                author_id__in={recipe.author_id for recipe in recipes},
+            ).values_list('author_id', flat=True))
+            for recipe in recipes:
+                recipe.author_is_subscribed = recipe.author_id in followed
+
+    def prepare_rows(self, rows):
+        self.set_user_flags(rows)
+
+    def get_serializer(self, *args, **kwargs):
+        if args and self.request.method in SAFE_METHODS:
+            if kwargs.get('many'):
+                args = (list(args[0]), *args[1:])
+                self.set_user_flags(args[0])
+            else:
+                self.set_user_flags([args[0]])
+        return super().get_serializer(*args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        if (
+            can_build_recipe_documents()
+            and self.fields_query_param not in request.query_params
+            and self.omit_query_param not in request.query_params
+        ):
+            document = pk.isdigit() and get_recipe_document(int(pk), request)
+            if not document:
+                raise Http404
+            return Response(document)
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        soft_delete_recipe(instance)
+
     def __post(self, model, user, pk):
         recipe = get_object_or_404(Recipe, id=pk)
         model.objects.create(user=user, recipe=recipe)
@@ -81,9 +219,76 @@ class RecipeViewSet(viewsets.ModelViewSet):
         elif request.method == 'DELETE':
             return self.__delete(ShoppingCart, request.user, pk)
 
+    @action(
+        detail=False, methods=['get'],
+        permission_classes=[IsAuthenticated]
+    )
+    def feed(self, request):
+        paginator = KeysetPagination()
+        recipes, next_position = get_feed_page(
+            request.user,
+            paginator.get_page_size(request),
+            paginator.decode_cursor(request),
+            self.get_queryset(),
+        )
+        serializer = self.get_serializer(recipes, many=True)
+        return paginator.get_paginated_response(
+            request, serializer.data, next_position
+        )
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        recipe = get_object_or_404(Recipe, id=pk)
+        recipes = Recipe.objects.filter(
+            similar_to__recipe_id=recipe.pk
+        ).order_by('-similar_to__score')
+        serializer = ShortRecipeSerializer(
+            recipes, many=True, context={'request': request}
+        )
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def by_ingredients(self, request):
+        try:
+            ingredient_ids = [
+                int(ingredient_id)
+                for value in request.query_params.getlist('ingredients')
+                for ingredient_id in value.split(',') if ingredient_id
+            ]
+            min_match = int(request.query_params.get('min_match', 1))
+            limit = min(int(request.query_params.get('limit', 20)), 100)
+        except ValueError:
+            return Response(
+                {'errors': 'Параметры должны быть целыми числами'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not ingredient_ids:
+            return Response(
+                {'errors': 'Укажите хотя бы один ингредиент'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        tag_ids = None
+        if 'tags' in request.query_params:
+            tag_ids_by_slug = get_tag_ids_by_slug()
+            tag_ids = [
+                tag_ids_by_slug[slug]
+                for slug in request.query_params.getlist('tags')
+                if slug in tag_ids_by_slug
+            ]
+        recipe_ids = get_ingredient_index().search(
+            ingredient_ids, max(min_match, 1), tag_ids, max(limit, 1)
+        )
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes], many=True
+        )
+        return Response(serializer.data)
+
     def create_shopping_cart(self, user):
         ingredients = (
-            IngredientAmount.objects.filter(recipe__list__user=user)
+            IngredientAmount.objects.filter(
+                recipe__list__user=user, recipe__deleted_at__isnull=True
+            )
             .values('ingredient__name', 'ingredient__measurement_unit')
             .annotate(amount=Sum('amount'))
         )
@@ -97,7 +302,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(
         detail=False, methods=['get'],
-        permission_classes=[IsAuthenticated]
+        permission_classes=[IsAuthenticated],
+        throttle_scope='shopping_cart'
     )
     def download_shopping_cart(self, request):
         user = request.user
@@ -115,9 +321,35 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return response
 
 
-class FollowViewSet(UserViewSet):
+class FollowViewSet(SparseFieldsMixin, UserViewSet):
     serializer_class = UserSubcribedSerializer
     pagination_class = LimitPageNumberPagination
+    field_columns = {
+        'email': 'email',
+        'id': 'id',
+        'username': 'username',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset().filter(deleted_at__isnull=True)
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        fields = self.get_requested_fields()
+        queryset = queryset.only('id', *(
+            self.field_columns[name] for name in fields
+            if name in self.field_columns
+        ))
+        user = self.request.user
+        if user.is_authenticated and 'is_subscribed' in fields:
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Follow.objects.filter(user=user, author_id=OuterRef('pk'))
+            ))
+        return queryset
+
+    def perform_destroy(self, instance):
+        soft_delete_user(instance)
 
     @action(
         detail=False, methods=['get'],
@@ -125,22 +357,69 @@ class FollowViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        queryset = Follow.objects.filter(user=user)
-        paginator = self.paginate_queryset(queryset)
+        fields = self.get_requested_fields(FollowSerializer)
+        queryset = Follow.objects.filter(
+            user=user, author__deleted_at__isnull=True
+        ).select_related('author')
+        if 'recipes_count' in fields:
+            queryset = queryset.annotate(recipes_count=Count(
+                'author__recipes',
+                filter=Q(author__recipes__deleted_at__isnull=True),
+            ))
+        paginator = self.paginate_queryset(queryset.order_by('id'))
         serializer = FollowSerializer(
             paginator,
             context={'request': request},
-            many=True
+            many=True,
+            fields=fields,
         )
         return self.get_paginated_response(serializer.data)
 
+    @action(
+        detail=False, methods=['get'], url_path='me/stats',
+        permission_classes=[IsAuthenticated]
+    )
+    def stats(self, request):
+        try:
+            days = int(request.query_params.get('days', 30))
+            recipe_id = request.query_params.get('recipe')
+            recipe_id = int(recipe_id) if recipe_id else None
+        except ValueError:
+            return Response(
+                {'errors': 'Параметры должны быть целыми числами'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        days = min(max(days, 1), settings.RECIPE_STATS_MAX_DAYS)
+        today = timezone.localdate()
+        since = today - timedelta(days=days - 1)
+        rows = {
+            row['day']: row
+            for row in get_author_stats(request.user, since, recipe_id)
+        }
+        series = []
+        for offset in range(days):
+            day = since + timedelta(days=offset)
+            row = rows.get(day, {})
+            series.append({
+                'date': day,
+                'favorites': row.get('favorites', 0),
+                'shopping_carts': row.get('shopping_carts', 0),
+            })
+        return Response({
+            'favorites': sum(point['favorites'] for point in series),
+            'shopping_carts': sum(
+                point['shopping_carts'] for point in series
+            ),
+            'days': series,
+        })
+
     @action(
         detail=True, methods=['post', ],
         permission_classes=[IsAuthenticated]
     )
     def subscribe(self, request, id=None):
         user = request.user
-        author = get_object_or_404(User, id=id)
+        author = get_object_or_404(User, id=id, deleted_at__isnull=True)
 
         if user == author:
             return Response(
@@ -154,6 +433,9 @@ class FollowViewSet(UserViewSet):
             )
 
         follow = Follow.objects.create(user=user, author=author)
+        enqueue('recipes.backfill_feed', {
+            'user_id': user.id, 'author_id': author.id
+        })
         serializer = FollowSerializer(
             follow, context={'request': request}
         )
@@ -166,9 +448,117 @@ class FollowViewSet(UserViewSet):
         follow = Follow.objects.filter(user=user, author=author)
         if follow.exists():
             follow.delete()
+            remove_from_feed(user.id, author.id)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         return Response(
             {'errors': ('Вы не подписывались на этого автора')},
             status=status.HTTP_400_BAD_REQUEST
         )
+
+
+class BatchView(APIView):
+    """Run several GET requests to the API in one round trip.
+
+    Accepts {"requests": [{"url": "/api/tags/"}, ...], "parallel": false}
+    and returns a list of {"status", "body"} in the same order.
+    Sub-requests skip middleware and reuse the authentication of the
+    batch request; permissions and throttles of every view still apply.
+    """
+
+    permission_classes = (AllowAny,)
+
+    def post(self, request):
+        subrequests = (
+            request.data.get('requests')
+            if isinstance(request.data, dict) else None
+        )
+        if not isinstance(subrequests, list) or not subrequests:
+            return Response(
+                {'errors': 'Передайте непустой список запросов requests'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(subrequests) > settings.BATCH_MAX_REQUESTS:
+            return Response(
+                {'errors': (
+                    f'Не больше {settings.BATCH_MAX_REQUESTS} '
+                    'запросов за раз'
+                )},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        urls = []
+        for subrequest in subrequests:
+            if (
+                not isinstance(subrequest, dict)
+                or not isinstance(subrequest.get('url'), str)
+                or str(subrequest.get('method', 'GET')).upper() != 'GET'
+            ):
+                return Response(
+                    {'errors': 'Поддерживаются только GET-запросы с url'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            urls.append(subrequest['url'])
+        if request.data.get('parallel') and len(urls) > 1:
+            read_from_replica = get_read_from_replica()
+            workers = min(len(urls), settings.BATCH_MAX_WORKERS)
+            with ThreadPoolExecutor(workers) as executor:
+                results = list(executor.map(
+                    lambda url: self.run_in_thread(
+                        request, url, read_from_replica
+                    ),
+                    urls
+                ))
+        else:
+            results = [self.run_subrequest(request, url) for url in urls]
+        return Response(results)
+
+    def run_in_thread(self, request, url, read_from_replica):
+        set_read_from_replica(read_from_replica)
+        try:
+            return self.run_subrequest(request, url)
+        finally:
+            set_read_from_replica(False)
+            connections.close_all()
+
+    def run_subrequest(self, request, url):
+        url = urlsplit(url)
+        try:
+            match = resolve(url.path)
+        except Resolver404:
+            match = None
+        if (
+            match is None
+            or 'api' not in match.namespaces
+            or url.path == request.path
+        ):
+            return {
+                'status': status.HTTP_404_NOT_FOUND,
+                'body': {'detail': 'Не найдено.'},
+            }
+        environ = {
+            **request.META,
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': url.path,
+            'QUERY_STRING': url.query,
+            'CONTENT_LENGTH': '0',
+            'wsgi.input': BytesIO(),
+        }
+        environ.pop('CONTENT_TYPE', None)
+        subrequest = WSGIRequest(environ)
+        if request.user and request.user.is_authenticated:
+            subrequest._force_auth_user = request.user
+            subrequest._force_auth_token = request.auth
+        response = match.func(subrequest, *match.args, **match.kwargs)
+        result = {'status': response.status_code}
+        if isinstance(response, Response):
+            result['body'] = response.data
+        elif not response.streaming:
+            result['body'] = response.content.decode(response.charset)
+        headers = {
+            header: response[header]
+            for header in ('Location', 'Retry-After')
+            if response.has_header(header)
+        }
+        if headers:
+            result['headers'] = headers
+        return result
@@ -8,5 +8,12 @@ python manage.py collectstatic --no-input
 echo "Load ingredients..."
 python manage.py loaddata data/ingredients.json
 
+echo "Publish ingredients..."
+python manage.py publish_ingredients
+
 echo "Start foodgram..."
-gunicorn foodgram.wsgi:application --bind 0.0.0.0:8000 --log-level debug
+# Metric files of the previous run would be summed with the new ones.
+export PROMETHEUS_MULTIPROC_DIR=/tmp/prometheus
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+gunicorn foodgram.wsgi:application --bind 0.0.0.0:8000 --log-level debug \
+    --config gunicorn.conf.py
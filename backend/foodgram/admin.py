@@ -0,0 +1,63 @@
+from django.db import transaction
+
+
+class ShortDeleteConfirmationMixin:
+    """Confirm deletion without running the admin collector.
+
+    The collector loads every dependent row to show it on the
+    confirmation page, which is unusable for an author with thousands of
+    recipes or an ingredient used in most of them.
+    """
+
+    def get_deleted_objects(self, objs, request):
+        objs = list(objs)
+        opts = self.model._meta
+        return (
+            [str(obj) for obj in objs],
+            {opts.verbose_name_plural: len(objs)},
+            set(),
+            [],
+        )
+
+
+class SoftDeleteAdminMixin(ShortDeleteConfirmationMixin):
+    """Delete objects through soft_delete instead of deleting rows.
+
+    The object is hidden at once and purged in the background. When
+    soft_delete_many is set, "delete selected" passes it the queryset.
+    """
+
+    soft_delete = None
+    soft_delete_many = None
+
+    def delete_model(self, request, obj):
+        self.soft_delete(obj)
+
+    def delete_queryset(self, request, queryset):
+        if self.soft_delete_many is not None:
+            self.soft_delete_many(queryset)
+            return
+        for obj in queryset:
+            self.soft_delete(obj)
+
+
+class ChunkedDeleteAdminMixin(ShortDeleteConfirmationMixin):
+    """Delete the selected objects delete_chunk_size at a time.
+
+    Every chunk, with the rows that cascade from it, is deleted in its
+    own transaction, so locks are held briefly.
+    """
+
+    delete_chunk_size = 100
+
+    def delete_queryset(self, request, queryset):
+        ids = queryset.order_by('pk').values_list('pk', flat=True)
+        last_id = None
+        while True:
+            chunk = ids if last_id is None else ids.filter(pk__gt=last_id)
+            chunk = list(chunk[:self.delete_chunk_size])
+            if not chunk:
+                return
+            with transaction.atomic():
+                self.model.objects.filter(pk__in=chunk).delete()
+            last_id = chunk[-1]
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Per-process pool of DB-API connections.
+
+    Connections idle for longer than ``idle_timeout`` seconds are closed,
+    connections idle for longer than ``ping_interval`` seconds are checked
+    with ``ping`` before they are handed out again.
+    """
+
+    def __init__(self, ping, reset, max_size=10, idle_timeout=300,
+                 pre_ping=True, ping_interval=5, timeout=10):
+        self.ping = ping
+        self.reset = reset
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.pre_ping = pre_ping
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._idle = deque()
+        self._size = 0
+        self._condition = threading.Condition()
+        self._counters = dict.fromkeys(
+            ('created', 'reused', 'discarded', 'waits', 'ping_failures',
+             'timeouts'), 0
+        )
+
+    def acquire(self, connect):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            connection, idle_for = self._checkout(deadline)
+            if connection is None:
+                return self._create(connect)
+            if (
+                not self.pre_ping
+                or idle_for < self.ping_interval
+                or self.ping(connection)
+            ):
+                self._count('reused')
+                return connection
+            self._count('ping_failures')
+            self.discard(connection)
+
+    def release(self, connection):
+        if os.getpid() != self.pid or not self.reset(connection):
+            self.discard(connection)
+            return
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._size -= 1
+            self._counters['discarded'] += 1
+            self._condition.notify()
+
+    def close_idle(self):
+        with self._condition:
+            while self._idle:
+                connection, _ = self._idle.popleft()
+                self._close_expired(connection)
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                **self._counters,
+            }
+
+    def _checkout(self, deadline):
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                while (
+                    self._idle
+                    and now - self._idle[0][1] > self.idle_timeout
+                ):
+                    self._close_expired(self._idle.popleft()[0])
+                if self._idle:
+                    connection, released_at = self._idle.pop()
+                    return connection, now - released_at
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, None
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'No free connection in {self.timeout} seconds '
+                        f'(max_size={self.max_size}).'
+                    )
+                self._counters['waits'] += 1
+                self._condition.wait(remaining)
+
+    def _close_expired(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        self._size -= 1
+        self._counters['discarded'] += 1
+
+    def _create(self, connect):
+        try:
+            connection = connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        self._count('created')
+        return connection
+
+    def _count(self, name):
+        with self._condition:
+            self._counters[name] += 1
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, database, factory):
+    """Return the pool of connections to a database of an alias.
+
+    The test runner points an alias at another database, so connections
+    are pooled per (alias, database) pair.
+    """
+    key = (alias, database)
+    pool = _pools.get(key)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[key] = factory()
+        return pool
+
+
+def close_idle_connections():
+    for pool in list(_pools.values()):
+        if pool.pid == os.getpid():
+            pool.close_idle()
+
+
+def get_pool_stats():
+    """Stats of this process's pools by (alias, database)."""
+    return {
+        key: pool.stats()
+        for key, pool in _pools.items()
+        if pool.pid == os.getpid()
+    }
@@ -0,0 +1,84 @@
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+
+from ..pool import (ConnectionPool, PoolTimeout, close_idle_connections,
+                    get_pool)
+
+Database = base.Database
+
+
+def ping_connection(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if (
+            connection.get_transaction_status()
+            != extensions.TRANSACTION_STATUS_IDLE
+        ):
+            connection.rollback()
+    except Database.Error:
+        return False
+    return True
+
+
+def reset_connection(connection):
+    if connection.closed:
+        return False
+    status = connection.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        try:
+            connection.rollback()
+        except Database.Error:
+            return False
+    return True
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections would keep the database from being dropped.
+        close_idle_connections()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend that keeps connections in a per-worker pool."""
+
+    creation_class = DatabaseCreation
+
+    def get_pool(self):
+        options = self.settings_dict.get('POOL', {})
+        database = tuple(
+            self.settings_dict.get(key)
+            for key in ('HOST', 'PORT', 'NAME', 'USER')
+        )
+        return get_pool(self.alias, database, lambda: ConnectionPool(
+            ping=ping_connection,
+            reset=reset_connection,
+            max_size=options.get('MAX_SIZE', 10),
+            idle_timeout=options.get('IDLE_TIMEOUT', 300),
+            pre_ping=options.get('PRE_PING', True),
+            ping_interval=options.get('PING_INTERVAL', 5),
+            timeout=options.get('TIMEOUT', 10),
+        ))
+
+    def get_new_connection(self, conn_params):
+        try:
+            connection = self.get_pool().acquire(
+                lambda: super(DatabaseWrapper, self).get_new_connection(
+                    conn_params
+                )
+            )
+        except PoolTimeout as error:
+            raise Database.OperationalError(str(error)) from error
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.get_pool().release(self.connection)
@@ -0,0 +1,177 @@
+import os
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+from .db.pool import get_pool_stats
+
+# Every gunicorn worker writes its samples to memory-mapped files in
+# PROMETHEUS_MULTIPROC_DIR, and /metrics merges the files of all workers.
+# Without the variable, as under runserver, samples stay in the process.
+MULTIPROCESS = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+SIZE_BUCKETS = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, float('inf')
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, float('inf'))
+
+REQUESTS = Counter(
+    'foodgram_requests_total', 'HTTP requests.',
+    ('view', 'method', 'status'),
+)
+REQUEST_LATENCY = Histogram(
+    'foodgram_request_duration_seconds', 'Time to build the response.',
+    ('view', 'method'),
+)
+RESPONSE_SIZE = Histogram(
+    'foodgram_response_size_bytes', 'Size of response bodies.',
+    ('view', 'method'), buckets=SIZE_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    'foodgram_db_queries', 'Database queries per request.',
+    ('view', 'method'), buckets=QUERY_BUCKETS,
+)
+DB_TIME = Histogram(
+    'foodgram_db_duration_seconds', 'Time spent in the database per request.',
+    ('view', 'method'),
+)
+SERIALIZER_TIME = Histogram(
+    'foodgram_serializer_duration_seconds',
+    'Time to serialize one object, nested serializers included.',
+    ('serializer',),
+)
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests_total', 'Cache lookups by key prefix.',
+    ('prefix', 'result'),
+)
+DB_POOL = Gauge(
+    'foodgram_db_pool_connections', 'Connections in the pools of workers.',
+    ('alias', 'database', 'state'), multiprocess_mode='livesum',
+)
+DB_POOL_EVENTS = Gauge(
+    'foodgram_db_pool_events', 'Pool events since the workers started.',
+    ('alias', 'database', 'event'), multiprocess_mode='livesum',
+)
+
+
+def get_view_name(request):
+    match = request.resolver_match
+    return match.view_name if match else '<unresolved>'
+
+
+def update_pool_metrics():
+    for (alias, key), stats in get_pool_stats().items():
+        # Pools are keyed by the HOST, PORT, NAME and USER of the alias.
+        database = key[2] or ''
+        for name, value in stats.items():
+            if name in ('size', 'idle', 'in_use', 'max_size'):
+                DB_POOL.labels(alias, database, name).set(value)
+            else:
+                DB_POOL_EVENTS.labels(alias, database, name).set(value)
+
+
+class QueryTimer:
+    """execute_wrapper that counts queries and the time they take."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """Record latency, response size and database use of every request."""
+
+    def __init__(self, get_response):
+        if not settings.METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+        labels = get_view_name(request), request.method
+        REQUESTS.labels(*labels, response.status_code).inc()
+        REQUEST_LATENCY.labels(*labels).observe(duration)
+        DB_QUERIES.labels(*labels).observe(timer.count)
+        DB_TIME.labels(*labels).observe(timer.duration)
+        if not response.streaming:
+            RESPONSE_SIZE.labels(*labels).observe(len(response.content))
+        update_pool_metrics()
+        return response
+
+
+class MeteredCache:
+    """Cache backend that counts hits and misses of another backend.
+
+    The real backend is given by OPTIONS['BACKEND']; everything except
+    the lookups is passed to it unchanged. Lookups are counted by the
+    key prefix before the first colon.
+    """
+
+    missing = object()
+
+    def __init__(self, location, params):
+        params = dict(params)
+        options = dict(params.get('OPTIONS', {}))
+        backend = import_string(options.pop('BACKEND'))
+        params['OPTIONS'] = options
+        self._cache = backend(location, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cache, name)
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    @staticmethod
+    def count(key, result, amount=1):
+        CACHE_REQUESTS.labels(str(key).split(':', 1)[0], result).inc(amount)
+
+    def get(self, key, default=None, version=None):
+        value = self._cache.get(key, self.missing, version=version)
+        if value is self.missing:
+            self.count(key, 'miss')
+            return default
+        self.count(key, 'hit')
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = self._cache.get_many(keys, version=version)
+        for key in keys:
+            self.count(key, 'hit' if key in values else 'miss')
+        return values
+
+
+def metrics_view(request):
+    """Prometheus text format; nginx does not route /metrics outside."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        update_pool_metrics()
+        registry = REGISTRY
+    return HttpResponse(
+        generate_latest(registry), content_type=CONTENT_TYPE_LATEST
+    )
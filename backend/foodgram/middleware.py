@@ -0,0 +1,129 @@
+import cProfile
+import hashlib
+import os
+import random
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+from .routers import set_read_from_replica
+
+
+class ReplicaRoutingMiddleware:
+    """Route safe API requests to replicas.
+
+    A client that has just sent a write is pinned to the primary for
+    REPLICA_PIN_SECONDS so it always reads its own changes. The pin is
+    kept in the cache, which has to be shared by the workers for a read
+    served by another worker to see it.
+    """
+
+    # POST endpoints that only read.
+    read_only_paths = ('/api/batch/',)
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+        pin_key = self.get_pin_key(request)
+        read_only = (
+            request.method in SAFE_METHODS
+            or request.path in self.read_only_paths
+        )
+        if read_only:
+            set_read_from_replica(
+                request.path.startswith('/api/')
+                and not cache.get(pin_key)
+            )
+        try:
+            response = self.get_response(request)
+        finally:
+            set_read_from_replica(False)
+        if not read_only:
+            cache.set(pin_key, True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    def get_pin_key(self, request):
+        # Anonymous clients by the address the trusted proxies forwarded,
+        # as throttling tells them apart; REMOTE_ADDR is nginx.
+        client = (
+            request.META.get('HTTP_AUTHORIZATION')
+            or BaseThrottle().get_ident(request)
+        )
+        return 'db-pin:' + hashlib.md5(client.encode()).hexdigest()
+
+
+def get_profile_dir(view_name):
+    return os.path.join(
+        settings.PROFILE_DIR, re.sub(r'[^\w.-]', '_', view_name)
+    )
+
+
+class ProfilingMiddleware:
+    """Profile a sample of requests with cProfile.
+
+    A request is profiled with probability PROFILE_SAMPLE_RATE, or when
+    it carries the X-Profile header and comes from a staff user. Every
+    profile is dumped to PROFILE_DIR/<view name>/, where only the latest
+    PROFILE_KEEP files are kept, or all of them when it is 0; the
+    profile_summary command aggregates them per view. A request that is
+    not profiled costs one random() call and a header lookup; the token
+    of a request with the header is checked before the profiler is
+    turned on.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampled = random.random() < settings.PROFILE_SAMPLE_RATE
+        if not sampled and not (
+            settings.PROFILE_HEADER in request.META
+            and self.is_staff(request)
+        ):
+            return self.get_response(request)
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return self.get_response(request)
+        finally:
+            profile.disable()
+            self.save(request, profile)
+
+    @staticmethod
+    def is_staff(request):
+        try:
+            result = TokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return result is not None and result[0].is_staff
+
+    def save(self, request, profile):
+        match = request.resolver_match
+        directory = get_profile_dir(match.view_name if match else '404')
+        os.makedirs(directory, exist_ok=True)
+        profile.dump_stats(os.path.join(
+            directory, f'{time.time():.6f}-{os.getpid()}.prof'
+        ))
+        if settings.PROFILE_KEEP <= 0:
+            return
+        files = sorted(
+            entry.path for entry in os.scandir(directory)
+            if entry.name.endswith('.prof')
+        )
+        for path in files[:max(len(files) - settings.PROFILE_KEEP, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,53 @@
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Below this many rows an exact COUNT(*) is cheap enough.
+ESTIMATE_THRESHOLD = 10000
+
+
+def compile_where(queryset):
+    query = queryset.query
+    sql, params = query.get_compiler(queryset.db).compile(query.where)
+    return sql, list(params)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that takes the row count of unfiltered PostgreSQL tables
+    from the planner statistics instead of running COUNT(*).
+
+    The filter of the model's default manager, such as hiding soft
+    deleted recipes, does not count as filtering: those rows are few.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = self.estimate_count()
+        if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+            return estimate
+        return super().count
+
+    def estimate_count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return None
+        try:
+            filtered = bool(queryset.query.where) and (
+                compile_where(queryset)
+                != compile_where(queryset.model._default_manager.all())
+            )
+        except EmptyResultSet:
+            return None
+        if filtered:
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        return int(row[0]) if row else None
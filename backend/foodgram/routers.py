@@ -0,0 +1,34 @@
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+
+
+def set_read_from_replica(value):
+    _state.read_from_replica = value
+
+
+def get_read_from_replica():
+    return getattr(_state, 'read_from_replica', False)
+
+
+class PrimaryReplicaRouter:
+    """Send reads to a replica while the current request allows it."""
+
+    def db_for_read(self, model, **hints):
+        if (
+            not settings.REPLICA_DATABASES
+            or not get_read_from_replica()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.REPLICA_DATABASES)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
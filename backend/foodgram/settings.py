@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'jobs.apps.JobsConfig',
     'rest_framework',
     'rest_framework.authtoken',
     'django_filters',
@@ -48,6 +49,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.metrics.MetricsMiddleware',
+    'foodgram.middleware.ProfilingMiddleware',
+    'foodgram.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -56,6 +60,17 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Prometheus metrics on /metrics, see foodgram.metrics.
+METRICS = os.getenv('METRICS', 'True') == 'True'
+
+# Request profiling, see foodgram.middleware.ProfilingMiddleware.
+PROFILING = os.getenv('PROFILING', 'False') == 'True'
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+# Latest profiles kept per view, 0 keeps all.
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', 50))
+
 ROOT_URLCONF = 'foodgram.urls'
 
 TEMPLATES = [
@@ -88,8 +103,72 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'postgres'),
         'HOST': os.getenv('DB_HOST', 'db'),
         'PORT': os.getenv('DB_PORT', 5432),
+        # Behind an external transaction-mode pooler (PgBouncer) server-side
+        # cursors can't be used.
+        'DISABLE_SERVER_SIDE_CURSORS': (
+            os.getenv('DB_EXTERNAL_POOLER', 'False') == 'True'
+        ),
+    }
+}
+
+# Per-worker connection pool for PostgreSQL. Connections go back to the pool
+# at the end of every request, so Django itself doesn't keep them.
+if (
+    os.getenv('DB_POOL', 'True') == 'True'
+    and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql'
+):
+    DATABASES['default']['ENGINE'] = 'foodgram.db.postgresql'
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['POOL'] = {
+        'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+        'IDLE_TIMEOUT': int(os.getenv('DB_POOL_IDLE_TIMEOUT', 300)),
+        'PRE_PING': os.getenv('DB_POOL_PRE_PING', 'True') == 'True',
+        'PING_INTERVAL': int(os.getenv('DB_POOL_PING_INTERVAL', 5)),
+        'TIMEOUT': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(
+        os.getenv('DB_CONN_MAX_AGE', 60)
+    )
+
+# Read replicas: comma separated hosts (or file names for SQLite).
+REPLICA_DATABASES = []
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1
+):
+    alias = f'replica_{number}'
+    replica_key = 'NAME' if 'sqlite3' in DATABASES['default']['ENGINE'] else 'HOST'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        replica_key: replica.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['foodgram.routers.PrimaryReplicaRouter']
+
+# Clients that have just written read from the primary for this long.
+REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+# Throttling buckets, replica pins and the ingredient index version must
+# be seen by every worker, so docker-compose points the cache at memcached.
+# LocMemCache keeps them per process, which is only right under runserver.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
+if METRICS:
+    # Count hits and misses in front of the configured backend.
+    CACHES['default']['OPTIONS'] = {'BACKEND': CACHES['default']['BACKEND']}
+    CACHES['default']['BACKEND'] = 'foodgram.metrics.MeteredCache'
 
 
 # Password validation
@@ -134,6 +213,36 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Uploaded files are named by their content hash and never rewritten.
+DEFAULT_FILE_STORAGE = 'foodgram.storage.ContentAddressedStorage'
+# Unreferenced media files younger than this are not deleted: an upload
+# of the same content may not be committed yet.
+MEDIA_GC_GRACE_SECONDS = 60 * 60
+
+# Deleted users and recipes are purged in the background: rows per
+# DELETE, and recipes per step when a user goes with all their recipes.
+PURGE_BATCH_SIZE = 1000
+PURGE_RECIPES_BATCH_SIZE = 100
+
+# Email
+# https://docs.djangoproject.com/en/2.2/topics/email/
+
+# Locally letters are written to files in EMAIL_FILE_PATH.
+EMAIL_BACKEND = os.getenv(
+    'EMAIL_BACKEND', 'django.core.mail.backends.filebased.EmailBackend'
+)
+EMAIL_FILE_PATH = os.getenv(
+    'EMAIL_FILE_PATH', os.path.join(BASE_DIR, 'sent_emails')
+)
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'False') == 'True'
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'noreply@foodgram.ru')
+
+# Links in letters point to the frontend at this address.
+SITE_URL = os.getenv('SITE_URL', 'http://localhost')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -147,8 +256,82 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.LimitPageNumberPagination',
     'PAGE_SIZE': 6,
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Only views and actions with a throttle_scope are limited.
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.UserTokenBucketThrottle',
+        'api.throttling.IPTokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'shopping_cart': os.getenv('THROTTLE_SHOPPING_CART', '10/m'),
+        'shopping_cart_ip': os.getenv('THROTTLE_SHOPPING_CART_IP', '60/m'),
+        'recipe_create': os.getenv('THROTTLE_RECIPE_CREATE', '30/h'),
+        'recipe_create_ip': os.getenv('THROTTLE_RECIPE_CREATE_IP', '120/h'),
+        'ingredient_list': os.getenv('THROTTLE_INGREDIENT_LIST', '30/m'),
+        'ingredient_list_ip': os.getenv(
+            'THROTTLE_INGREDIENT_LIST_IP', '120/m'
+        ),
+    },
+    # nginx appends the client address to X-Forwarded-For.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
 }
 
+# Recipes are copied into followers' feeds unless the author has more
+# followers than this; such recipes are merged into the feed on read.
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS', 10000))
+FEED_FANOUT_BATCH_SIZE = 1000
+# How many latest recipes of an author are added to the feed on subscribe.
+FEED_BACKFILL_SIZE = 50
+
+# On PostgreSQL the recipe detail is built by the database in one query.
+RECIPE_DOCUMENT_SQL = os.getenv('RECIPE_DOCUMENT_SQL', 'True') == 'True'
+
+SIMILAR_RECIPES_COUNT = 10
+
+# Rows read per query when a list is streamed with ?format=ndjson.
+NDJSON_CHUNK_SIZE = 500
+
+# Size of every popularity leaderboard (overall and per tag).
+POPULAR_RECIPES_COUNT = 100
+# Activity younger than this, in seconds, and the current hour are left
+# for the next refresh_popular_recipes run.
+POPULAR_RECIPES_LAG = 60
+
+# /api/users/me/stats/ returns at most this many days.
+RECIPE_STATS_MAX_DAYS = 365
+
+# Digests of new recipes: subscribers per step of send_digest, recipes
+# listed in one letter, and the period covered by the very first run.
+DIGEST_CHUNK_SIZE = 500
+DIGEST_MAX_RECIPES = 10
+DIGEST_PERIOD_DAYS = 7
+
+# Bounds, in seconds, on how often the in-memory ingredient index of a
+# worker is rebuilt after recipes change.
+INGREDIENT_INDEX_MIN_AGE = 10
+INGREDIENT_INDEX_MAX_AGE = 5 * 60
+
+# Limits of /api/batch/: sub-requests per batch and threads running them.
+BATCH_MAX_REQUESTS = 10
+BATCH_MAX_WORKERS = 4
+
+# Background jobs (see jobs.queue.enqueue). With JOBS_EAGER jobs run right
+# after the transaction commits, without a worker.
+JOBS_EAGER = os.getenv('JOBS_EAGER', 'False') == 'True'
+JOBS_MAX_ATTEMPTS = 5
+# Delay before the first retry; it doubles with every attempt.
+JOBS_RETRY_DELAY = 10
+# Running jobs locked for longer than this are put back into the queue.
+JOBS_LOCK_TIMEOUT = 10 * 60
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'SERIALIZERS': {
@@ -0,0 +1,37 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+from foodgram.paginator import EstimatedCountPaginator
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'name', 'status', 'attempts', 'run_at', 'created'
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('=dedup_key',)
+    actions = ('retry',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def retry(self, request, queryset):
+        failed = queryset.filter(status=Job.FAILED)
+        waiting = set(Job.objects.filter(
+            status=Job.PENDING,
+            dedup_key__in=failed.exclude(dedup_key='').values('dedup_key'),
+        ).values_list('name', 'dedup_key'))
+        retry_ids = [
+            job_id for job_id, name, dedup_key in failed.values_list(
+                'id', 'name', 'dedup_key'
+            )
+            if not dedup_key or (name, dedup_key) not in waiting
+        ]
+        count = Job.objects.filter(id__in=retry_ids).update(
+            status=Job.PENDING, attempts=0, run_at=timezone.now()
+        )
+        self.message_user(request, f'Возвращено в очередь: {count}')
+    retry.short_description = 'Повторить упавшие задачи'
+
+
+admin.site.register(Job, JobAdmin)
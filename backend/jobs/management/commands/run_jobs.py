@@ -0,0 +1,37 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Число потоков или процессов'
+        )
+        parser.add_argument(
+            '--processes', action='store_true',
+            help='Выполнять задачи в процессах вместо потоков'
+        )
+        parser.add_argument('--limit', type=int, default=100)
+        parser.add_argument('--poll-interval', type=float, default=1)
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Завершиться, когда в очереди не останется задач'
+        )
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            concurrency=options['concurrency'],
+            processes=options['processes'],
+            limit=options['limit'],
+            poll_interval=options['poll_interval'],
+        )
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        count = worker.run(burst=options['burst'])
+        self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {count}'))
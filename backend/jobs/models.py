@@ -0,0 +1,49 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Тип задачи', max_length=100)
+    payload = models.TextField('Параметры', default='{}')
+    dedup_key = models.CharField(
+        'Ключ дедупликации', max_length=255, blank=True, default=''
+    )
+    status = models.CharField(
+        'Статус', max_length=10, choices=STATUS_CHOICES, default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        'Максимум попыток', default=5
+    )
+    run_at = models.DateTimeField('Запустить после', default=timezone.now)
+    locked_at = models.DateTimeField('Взята в работу', null=True, blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ['run_at', 'id']
+        indexes = (
+            models.Index(
+                fields=('status', 'run_at'), name='job_status_run_at_idx'
+            ),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'dedup_key'),
+                condition=models.Q(status='pending') & ~models.Q(dedup_key=''),
+                name='unique_pending_job'),
+        )
+
+    def __str__(self):
+        return f'{self.name} #{self.id}'
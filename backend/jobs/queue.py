@@ -0,0 +1,39 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Job
+from .registry import get_handler
+
+
+def enqueue(name, payload=None, dedup_key='', delay=0, max_attempts=None):
+    """Queue a job in the current transaction.
+
+    The job becomes visible to workers only when the transaction commits,
+    and disappears with it on rollback. While a job with the same name and
+    dedup_key is waiting, another one is not queued.
+    """
+    if get_handler(name) is None:
+        raise ValueError(f'Unknown job {name!r}')
+    payload = payload or {}
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: run_eagerly(name, payload))
+        return
+    Job.objects.bulk_create([Job(
+        name=name,
+        payload=json.dumps(payload),
+        dedup_key=dedup_key,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+    )], ignore_conflicts=bool(dedup_key))
+
+
+def run_eagerly(name, payload):
+    handler = get_handler(name)
+    if handler.batch_size == 1:
+        handler.func(**payload)
+    else:
+        handler.func([payload])
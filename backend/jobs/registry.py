@@ -0,0 +1,21 @@
+from collections import namedtuple
+
+Handler = namedtuple('Handler', ('name', 'func', 'batch_size'))
+
+handlers = {}
+
+
+def job(name, batch_size=1):
+    """Register a function as the handler of jobs with the given name.
+
+    With batch_size 1 the handler gets the payload as keyword arguments,
+    otherwise it gets a list of up to batch_size payloads of the same name.
+    """
+    def decorator(func):
+        handlers[name] = Handler(name, func, batch_size)
+        return func
+    return decorator
+
+
+def get_handler(name):
+    return handlers.get(name)
@@ -0,0 +1,170 @@
+import json
+import logging
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from itertools import groupby
+
+import django
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+from .registry import get_handler
+
+logger = logging.getLogger(__name__)
+
+
+def run_batch(name, payloads):
+    """Run a batch of jobs of one name; return the error or None."""
+    handler = get_handler(name)
+    try:
+        if handler is None:
+            raise LookupError(f'Unknown job {name!r}')
+        if handler.batch_size == 1:
+            handler.func(**payloads[0])
+        else:
+            handler.func(payloads)
+    except Exception:
+        logger.exception('Job %s failed', name)
+        return traceback.format_exc()
+    finally:
+        # Pool threads and processes outlive the job: give the
+        # connection back instead of keeping it open between jobs.
+        connections.close_all()
+    return None
+
+
+class Worker:
+    """Takes due jobs from the database and runs them in a pool.
+
+    Jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so any number
+    of workers can share the queue. Jobs of the same name are grouped into
+    batches of up to their handler's batch_size.
+    """
+
+    def __init__(self, concurrency=4, processes=False, limit=100,
+                 poll_interval=1):
+        self.concurrency = concurrency
+        self.processes = processes
+        self.limit = limit
+        self.poll_interval = poll_interval
+        self.stopping = False
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def claim(self):
+        now = timezone.now()
+        with transaction.atomic():
+            jobs = list(
+                Job.objects.select_for_update(skip_locked=True).filter(
+                    status=Job.PENDING, run_at__lte=now
+                ).order_by('run_at', 'id')[:self.limit]
+            )
+            if not jobs:
+                return []
+            claimed = Job.objects.filter(
+                id__in=[job.id for job in jobs], status=Job.PENDING
+            ).update(
+                status=Job.RUNNING, locked_at=now, attempts=F('attempts') + 1
+            )
+            if claimed != len(jobs):
+                # Another worker on a database without row locks got
+                # some of them first.
+                transaction.set_rollback(True)
+                return []
+        for job in jobs:
+            job.attempts += 1
+        return jobs
+
+    def requeue_stale(self):
+        """Put back jobs whose worker died while running them."""
+        return Job.objects.filter(
+            status=Job.RUNNING,
+            locked_at__lt=timezone.now() - timedelta(
+                seconds=settings.JOBS_LOCK_TIMEOUT
+            ),
+        ).update(status=Job.PENDING, locked_at=None)
+
+    def batches(self, jobs):
+        jobs = sorted(jobs, key=lambda job: (job.name, job.run_at, job.id))
+        for name, group in groupby(jobs, key=lambda job: job.name):
+            group = list(group)
+            handler = get_handler(name)
+            size = handler.batch_size if handler is not None else 1
+            for start in range(0, len(group), size):
+                yield name, group[start:start + size]
+
+    def finish(self, jobs, error):
+        if error is None:
+            Job.objects.filter(id__in=[job.id for job in jobs]).delete()
+            return
+        fields = ('status', 'run_at', 'locked_at', 'last_error')
+        for job in jobs:
+            if job.attempts >= job.max_attempts:
+                job.status = Job.FAILED
+            else:
+                job.status = Job.PENDING
+                job.run_at = timezone.now() + timedelta(
+                    seconds=settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+                )
+            job.locked_at = None
+            job.last_error = error
+        retried = [
+            job for job in jobs if job.status == Job.PENDING and job.dedup_key
+        ]
+        Job.objects.bulk_update(
+            [job for job in jobs if job not in retried], fields
+        )
+        for job in retried:
+            try:
+                with transaction.atomic():
+                    job.save(update_fields=fields)
+            except IntegrityError:
+                # The same work is queued again; that job will do it.
+                job.delete()
+
+    def run_once(self, executor):
+        """Run one round of due jobs; return how many were run."""
+        jobs = self.claim()
+        futures = [
+            (batch, executor.submit(
+                run_batch, name, [json.loads(job.payload) for job in batch]
+            ))
+            for name, batch in self.batches(jobs)
+        ]
+        for batch, future in futures:
+            self.finish(batch, future.result())
+        return len(jobs)
+
+    def run(self, burst=False):
+        """Process jobs until stopped, or until the queue is empty."""
+        if self.processes:
+            # Spawned, not forked: a child must not inherit the parent's
+            # open database connections.
+            executor = ProcessPoolExecutor(
+                self.concurrency,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        else:
+            executor = ThreadPoolExecutor(self.concurrency)
+        total = 0
+        last_requeue = 0
+        with executor:
+            while not self.stopping:
+                if time.monotonic() - last_requeue > 60:
+                    self.requeue_stale()
+                    last_requeue = time.monotonic()
+                count = self.run_once(executor)
+                total += count
+                if not count:
+                    if burst:
+                        break
+                    time.sleep(self.poll_interval)
+        return total
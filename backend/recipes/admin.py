@@ -1,7 +1,29 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+
+from .bulk import add_tag, merge_ingredients, remove_tag
+from .fingerprint import expire_fingerprints, update_fingerprints
+from .models import (DigestRun, FavoriteRecipe, Ingredient,
+                     IngredientAmount, PurgeTask, Recipe, ShoppingCart, Tag)
+from .purge import soft_delete_recipe, soft_delete_recipes
+from foodgram.admin import ChunkedDeleteAdminMixin, SoftDeleteAdminMixin
+from foodgram.paginator import EstimatedCountPaginator
+
+
+class RecipeActionForm(ActionForm):
+    tag = forms.ModelChoiceField(
+        Tag.objects.all(), required=False, label='Тэг'
+    )
+
 
-from .models import (FavoriteRecipe, Ingredient, IngredientAmount, Recipe,
-                     ShoppingCart, Tag)
+class IngredientActionForm(ActionForm):
+    target = forms.IntegerField(
+        required=False, label='Объединить в ингредиент с ID'
+    )
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -11,29 +33,109 @@ class TagAdmin(admin.ModelAdmin):
         'color',
         'slug',
     )
+    search_fields = ('name', 'slug')
 
 
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(ChunkedDeleteAdminMixin, admin.ModelAdmin):
     list_display = (
         'id',
         'name',
         'measurement_unit',
     )
     search_fields = ('name',)
-
-
-class RecipeAdmin(admin.ModelAdmin):
+    action_form = IngredientActionForm
+    actions = ('merge_selected',)
+
+    def merge_selected(self, request, queryset):
+        target_id = request.POST.get('target', '').strip() or str(
+            queryset.order_by('pk').values_list('pk', flat=True).first()
+        )
+        target = Ingredient.objects.filter(
+            pk=int(target_id) if target_id.isdigit() else None
+        ).first()
+        if target is None:
+            self.message_user(
+                request, f'Ингредиент с ID {target_id} не найден',
+                messages.ERROR
+            )
+            return
+        try:
+            counts = merge_ingredients(target, queryset)
+        except ValidationError as error:
+            self.message_user(request, error.message, messages.ERROR)
+            return
+        self.message_user(
+            request,
+            f'Объединено в «{target}»: удалено ингредиентов '
+            f'{counts["ingredients"]}, перенесено строк рецептов '
+            f'{counts["moved"]}, сложено количеств {counts["summed"]}, '
+            f'удалено повторов {counts["removed"]}'
+        )
+    merge_selected.short_description = 'Объединить выбранные ингредиенты'
+
+
+class RecipeAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
     list_display = (
         'id',
         'name',
         'author',
         'count_favorites',
     )
-    list_filter = ('name', 'author', 'tags')
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    search_fields = ('name', 'author__username')
+    autocomplete_fields = ('author', 'tags')
     readonly_fields = ('count_favorites',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    soft_delete = staticmethod(soft_delete_recipe)
+    soft_delete_many = staticmethod(soft_delete_recipes)
+    action_form = RecipeActionForm
+    actions = ('tag_selected', 'untag_selected')
+
+    def get_action_tag(self, request):
+        tag = Tag.objects.filter(pk=request.POST.get('tag') or None).first()
+        if tag is None:
+            self.message_user(request, 'Выберите тэг', messages.ERROR)
+        return tag
+
+    def tag_selected(self, request, queryset):
+        tag = self.get_action_tag(request)
+        if tag is not None:
+            added = add_tag(queryset, tag)
+            self.message_user(
+                request, f'Тэг «{tag}» добавлен к рецептам: {added}'
+            )
+    tag_selected.short_description = 'Добавить тэг выбранным рецептам'
+
+    def untag_selected(self, request, queryset):
+        tag = self.get_action_tag(request)
+        if tag is not None:
+            removed = remove_tag(queryset, tag)
+            self.message_user(
+                request, f'Тэг «{tag}» снят с рецептов: {removed}'
+            )
+    untag_selected.short_description = 'Снять тэг с выбранных рецептов'
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        update_fingerprints([obj.pk])
+
+    def get_queryset(self, request):
+        # A correlated subquery is only evaluated for the rows on the page.
+        favorites = FavoriteRecipe.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(count=Count('id'))
+        return super().get_queryset(request).annotate(
+            favorites_count=Subquery(
+                favorites.values('count'), output_field=IntegerField()
+            )
+        )
 
     def count_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count or 0
+    count_favorites.short_description = 'В избранном'
+    count_favorites.admin_order_field = 'favorites_count'
 
 
 class IngredientAmountAdmin(admin.ModelAdmin):
@@ -43,6 +145,28 @@ class IngredientAmountAdmin(admin.ModelAdmin):
         'ingredient',
         'amount',
     )
+    list_select_related = ('recipe', 'ingredient')
+    raw_id_fields = ('recipe',)
+    autocomplete_fields = ('ingredient',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # A row moved to another recipe changes both.
+        update_fingerprints({obj.recipe_id, form.initial.get('recipe')})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        update_fingerprints([obj.recipe_id])
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        # Recomputed once the rows are gone.
+        expire_fingerprints(Recipe.all_objects.filter(
+            pk__in=queryset.values('recipe_id')
+        ))
+        super().delete_queryset(request, queryset)
 
 
 class FavoriteRecipeAdmin(admin.ModelAdmin):
@@ -51,6 +175,11 @@ class FavoriteRecipeAdmin(admin.ModelAdmin):
         'user',
         'recipe',
     )
+    list_select_related = ('user', 'recipe')
+    raw_id_fields = ('recipe',)
+    autocomplete_fields = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class ShoppingCartAdmin(admin.ModelAdmin):
@@ -59,6 +188,49 @@ class ShoppingCartAdmin(admin.ModelAdmin):
         'user',
         'recipe',
     )
+    list_select_related = ('user', 'recipe')
+    raw_id_fields = ('recipe',)
+    autocomplete_fields = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class PurgeTaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'kind',
+        'object_id',
+        'status',
+        'stage',
+        'deleted_rows',
+        'created',
+        'finished',
+    )
+    list_filter = ('status', 'kind')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class DigestRunAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'since',
+        'until',
+        'last_user_id',
+        'sent',
+        'started',
+        'finished',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 admin.site.register(Tag, TagAdmin)
@@ -67,3 +239,5 @@ admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(IngredientAmount, IngredientAmountAdmin)
 admin.site.register(FavoriteRecipe, FavoriteRecipeAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
+admin.site.register(PurgeTask, PurgeTaskAdmin)
+admin.site.register(DigestRun, DigestRunAdmin)
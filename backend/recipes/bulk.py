@@ -0,0 +1,124 @@
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+
+from .cache import clear_tag_ids_cache
+from .fingerprint import expire_fingerprints
+from .ingredient_index import mark_ingredient_index_changed
+from .models import Ingredient, IngredientAmount, Recipe
+from jobs.queue import enqueue
+
+
+def _tags_changed(tag, using=None):
+    """Refresh what is derived from the recipes of the tag."""
+    transaction.on_commit(mark_ingredient_index_changed, using)
+    transaction.on_commit(clear_tag_ids_cache, using)
+    enqueue(
+        'recipes.rebuild_tag_boards', {'tag_id': tag.pk},
+        dedup_key=str(tag.pk)
+    )
+
+
+def add_tag(recipes, tag):
+    """Tag the recipes in one INSERT ... SELECT; return rows added."""
+    through = Recipe.tags.through
+    recipe_column = through._meta.get_field('recipe').column
+    tag_column = through._meta.get_field('tag').column
+    using = router.db_for_write(through)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    ids_sql, ids_params = recipes.order_by().values('pk').query.get_compiler(
+        using
+    ).as_sql()
+    table = quote(through._meta.db_table)
+    sql = (
+        f'INSERT INTO {table} ({quote(recipe_column)}, {quote(tag_column)}) '
+        f'SELECT recipe.{quote(Recipe._meta.pk.column)}, %s '
+        f'FROM ({ids_sql}) recipe '
+        f'WHERE NOT EXISTS (SELECT 1 FROM {table} link '
+        f'WHERE link.{quote(recipe_column)} = '
+        f'recipe.{quote(Recipe._meta.pk.column)} '
+        f'AND link.{quote(tag_column)} = %s)'
+    )
+    with transaction.atomic(using), connection.cursor() as cursor:
+        cursor.execute(sql, [tag.pk, *ids_params, tag.pk])
+        added = cursor.rowcount
+        _tags_changed(tag, using)
+    return added
+
+
+def remove_tag(recipes, tag):
+    """Untag the recipes in one DELETE; return rows removed."""
+    with transaction.atomic():
+        removed, _ = Recipe.tags.through.objects.filter(
+            tag=tag, recipe_id__in=recipes.order_by().values('pk')
+        ).delete()
+        _tags_changed(tag)
+    return removed
+
+
+@transaction.atomic
+def merge_ingredients(target, sources):
+    """Move recipe ingredients of the sources to the target and delete them.
+
+    A recipe that lists several of the merged ingredients keeps one row
+    with their amounts summed: its target row if it has one, otherwise
+    its oldest source row. Returns counts of affected rows.
+    """
+    # Amounts in different units cannot be summed.
+    mismatched = list(sources.exclude(
+        measurement_unit=target.measurement_unit
+    ).values_list('name', 'measurement_unit')[:5])
+    if mismatched:
+        raise ValidationError(
+            f'Нельзя объединить с «{target}»: другие единицы измерения у '
+            + ', '.join(f'{name}, {unit}' for name, unit in mismatched)
+        )
+    source_ids = list(
+        sources.exclude(pk=target.pk).order_by().values_list('pk', flat=True)
+    )
+    if not source_ids:
+        return {'summed': 0, 'removed': 0, 'moved': 0, 'ingredients': 0}
+    # Fingerprints hash ingredient ids; they are recomputed in the
+    # background, the index and the snapshot are refreshed as usual.
+    expire_fingerprints(Recipe.all_objects.filter(
+        pk__in=IngredientAmount.objects.filter(
+            ingredient_id__in=source_ids
+        ).values('recipe_id')
+    ))
+    group_ids = [target.pk, *source_ids]
+    group = IngredientAmount.objects.filter(ingredient_id__in=group_ids)
+    recipes = group.order_by().values('recipe_id')
+    keepers = group.filter(
+        Q(ingredient_id=target.pk)
+        | Q(pk=Subquery(
+            IngredientAmount.objects.filter(
+                recipe_id=OuterRef('recipe_id'),
+                ingredient_id__in=source_ids,
+            ).order_by('pk').values('pk')[:1]
+        )) & ~Q(recipe_id__in=IngredientAmount.objects.filter(
+            ingredient_id=target.pk
+        ).values('recipe_id'))
+    ).order_by().values('pk')
+    shared = recipes.annotate(rows=Count('pk')).filter(
+        rows__gt=1
+    ).values('recipe_id')
+    summed = IngredientAmount.objects.filter(
+        pk__in=keepers, recipe_id__in=shared
+    ).update(amount=Subquery(
+        group.filter(recipe_id=OuterRef('recipe_id')).order_by().values(
+            'recipe_id'
+        ).annotate(total=Sum('amount')).values('total')
+    ))
+    removed, _ = group.exclude(pk__in=keepers).delete()
+    moved = IngredientAmount.objects.filter(
+        ingredient_id__in=source_ids
+    ).update(ingredient_id=target.pk)
+    deleted, _ = Ingredient.objects.filter(pk__in=source_ids).delete()
+    transaction.on_commit(mark_ingredient_index_changed)
+    return {
+        'summed': summed,
+        'removed': removed,
+        'moved': moved,
+        'ingredients': deleted,
+    }
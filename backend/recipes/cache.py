@@ -0,0 +1,18 @@
+from django.core.cache import cache
+
+from .models import Tag
+
+TAG_IDS_CACHE_KEY = 'recipes:tag-ids-by-slug'
+TAG_IDS_CACHE_TIMEOUT = 60 * 60
+
+
+def get_tag_ids_by_slug():
+    tag_ids = cache.get(TAG_IDS_CACHE_KEY)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(TAG_IDS_CACHE_KEY, tag_ids, TAG_IDS_CACHE_TIMEOUT)
+    return tag_ids
+
+
+def clear_tag_ids_cache():
+    cache.delete(TAG_IDS_CACHE_KEY)
@@ -0,0 +1,125 @@
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DigestRun, Recipe
+from users.models import Follow, User
+
+SUBJECT = 'Новые рецепты ваших авторов'
+
+
+def get_run(now=None):
+    """The unfinished run, or a new one from where the last run stopped."""
+    run = DigestRun.objects.filter(finished__isnull=True).order_by('id')
+    run = run.first()
+    if run is not None:
+        return run
+    now = now or timezone.now()
+    last = DigestRun.objects.filter(finished__isnull=False).order_by(
+        '-until'
+    ).first()
+    if last is not None:
+        since = last.until
+    else:
+        since = now - timedelta(days=settings.DIGEST_PERIOD_DAYS)
+    return DigestRun.objects.create(since=since, until=now)
+
+
+def _new_recipes(subscriber_ids, since, until):
+    """Recipes of followed authors published in [since, until).
+
+    One query for the whole chunk, rows ordered by subscriber.
+    """
+    return (
+        Recipe.objects.filter(
+            author__following__user_id__in=subscriber_ids,
+            pud_date__gte=since,
+            pud_date__lt=until,
+        )
+        .values_list(
+            'author__following__user_id', 'id', 'name',
+            'author__first_name', 'author__last_name',
+        )
+        .order_by('author__following__user_id', '-pud_date')
+    )
+
+
+def render_digest(user, recipes, since):
+    limit = settings.DIGEST_MAX_RECIPES
+    lines = [
+        f'Здравствуйте, {user.first_name}!',
+        '',
+        'Новые рецепты авторов, на которых вы подписаны, '
+        f'с {since:%d.%m.%Y}:',
+        '',
+    ]
+    for recipe_id, name, first_name, last_name in recipes[:limit]:
+        lines.append(
+            f'- {name} ({first_name} {last_name}): '
+            f'{settings.SITE_URL}/recipes/{recipe_id}'
+        )
+    if len(recipes) > limit:
+        lines += [
+            '',
+            f'И ещё {len(recipes) - limit} в ваших подписках: '
+            f'{settings.SITE_URL}/subscriptions',
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+def _chunk_messages(run, subscriber_ids):
+    users = User.objects.filter(
+        pk__in=subscriber_ids, is_active=True, deleted_at__isnull=True
+    ).exclude(email='').in_bulk()
+    messages = []
+    rows = _new_recipes(subscriber_ids, run.since, run.until)
+    for user_id, recipes in groupby(rows, key=lambda row: row[0]):
+        user = users.get(user_id)
+        if user is None:
+            continue
+        recipes = [recipe[1:] for recipe in recipes]
+        messages.append(EmailMessage(
+            SUBJECT, render_digest(user, recipes, run.since),
+            settings.DEFAULT_FROM_EMAIL, [user.email],
+        ))
+    return messages
+
+
+def send_digest(run, chunk_size=None):
+    """Send the run's digests, a chunk of subscribers at a time.
+
+    Subscribers are walked in order of id from the run's checkpoint;
+    every chunk is sent over one open mail connection and then the
+    checkpoint is moved past it in the same transaction. The run's row
+    is locked meanwhile, so parallel runs take turns instead of sending
+    twice. A chunk that fails after its mail went out is sent again on
+    resume. Yields the last subscriber id of every chunk and the number
+    of messages sent.
+    """
+    chunk_size = chunk_size or settings.DIGEST_CHUNK_SIZE
+    subscribers = Follow.objects.order_by('user_id').values_list(
+        'user_id', flat=True
+    ).distinct()
+    with get_connection() as connection:
+        while True:
+            with transaction.atomic():
+                run = DigestRun.objects.select_for_update().get(pk=run.pk)
+                if run.finished is not None:
+                    return
+                subscriber_ids = list(subscribers.filter(
+                    user_id__gt=run.last_user_id
+                )[:chunk_size])
+                if not subscriber_ids:
+                    run.finished = timezone.now()
+                    run.save(update_fields=('finished',))
+                    return
+                messages = _chunk_messages(run, subscriber_ids)
+                sent = connection.send_messages(messages) if messages else 0
+                run.last_user_id = subscriber_ids[-1]
+                run.sent += sent
+                run.save(update_fields=('last_user_id', 'sent'))
+            yield run.last_user_id, sent
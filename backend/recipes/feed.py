@@ -0,0 +1,129 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from users.models import Follow
+
+from .models import FeedEntry, Recipe
+
+CELEBRITIES_CACHE_KEY = 'recipes:feed-celebrities'
+CELEBRITIES_CACHE_TIMEOUT = 10 * 60
+
+
+def is_celebrity(author_id):
+    followers = Follow.objects.filter(author_id=author_id)
+    limit = settings.FEED_FANOUT_MAX_FOLLOWERS
+    return followers[:limit + 1].count() > limit
+
+
+def get_celebrity_ids():
+    """Authors with too many followers to fan their recipes out."""
+    celebrity_ids = cache.get(CELEBRITIES_CACHE_KEY)
+    if celebrity_ids is None:
+        celebrity_ids = set(
+            Follow.objects.values('author_id')
+            .annotate(followers=Count('id'))
+            .filter(followers__gt=settings.FEED_FANOUT_MAX_FOLLOWERS)
+            .values_list('author_id', flat=True)
+        )
+        cache.set(
+            CELEBRITIES_CACHE_KEY, celebrity_ids, CELEBRITIES_CACHE_TIMEOUT
+        )
+    return celebrity_ids
+
+
+def fan_out_recipe(recipe_id):
+    recipe = Recipe.objects.filter(id=recipe_id).first()
+    if recipe is None or is_celebrity(recipe.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=recipe.author_id
+    ).order_by('id')
+    last_id = 0
+    while True:
+        batch = list(
+            followers.filter(id__gt=last_id)
+            .values_list('id', 'user_id')[:settings.FEED_FANOUT_BATCH_SIZE]
+        )
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(
+                    user_id=user_id,
+                    recipe=recipe,
+                    author_id=recipe.author_id,
+                    pub_date=recipe.pud_date,
+                )
+                for _, user_id in batch
+            ],
+            ignore_conflicts=True,
+        )
+        last_id = batch[-1][0]
+
+
+def backfill_feed(user_id, author_id):
+    recipes = Recipe.objects.filter(author_id=author_id).values_list(
+        'id', 'pud_date'
+    )[:settings.FEED_BACKFILL_SIZE]
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for recipe_id, pub_date in recipes
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def remove_from_feed(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def get_feed_page(user, limit, before=None, queryset=None):
+    """Return a page of recipes for the user's feed and the next position.
+
+    Recipes of most authors come from the user's timeline. Recipes of
+    celebrities are read from Recipe and merged in at query time.
+    """
+    entries = FeedEntry.objects.filter(user=user)
+    if before is not None:
+        pub_date, recipe_id = before
+        entries = entries.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, recipe_id__lt=recipe_id)
+        )
+    positions = set(
+        entries.order_by('-pub_date', '-recipe_id')
+        .values_list('pub_date', 'recipe_id')[:limit + 1]
+    )
+    celebrity_ids = get_celebrity_ids()
+    if celebrity_ids:
+        followed_celebrities = Follow.objects.filter(
+            user=user, author_id__in=celebrity_ids
+        ).values('author_id')
+        recipes = Recipe.objects.filter(author_id__in=followed_celebrities)
+        if before is not None:
+            recipes = recipes.filter(
+                Q(pud_date__lt=pub_date)
+                | Q(pud_date=pub_date, id__lt=recipe_id)
+            )
+        positions.update(
+            recipes.order_by('-pud_date', '-id')
+            .values_list('pud_date', 'id')[:limit + 1]
+        )
+    positions = sorted(positions, reverse=True)
+    next_position = positions[limit - 1] if len(positions) > limit else None
+    positions = positions[:limit]
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    recipes = queryset.in_bulk([recipe_id for _, recipe_id in positions])
+    return (
+        [recipes[recipe_id] for _, recipe_id in positions
+         if recipe_id in recipes],
+        next_position,
+    )
@@ -0,0 +1,138 @@
+import hashlib
+import re
+from collections import defaultdict
+from itertools import islice
+
+from django.db.models import Count, Q
+
+from .models import IngredientAmount, Recipe
+from jobs.queue import enqueue
+
+SHINGLE_SIZE = 3
+
+
+def normalize_name(name):
+    name = name.lower().replace('ё', 'е')
+    return ' '.join(re.findall(r'\w+', name))
+
+
+def _hash(value):
+    digest = hashlib.blake2b(value.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def name_fingerprint(name):
+    """MinHash of the character shingles of the normalized name.
+
+    Names that share most of their shingles get the same value with a
+    probability equal to their Jaccard similarity, so small edits like
+    punctuation, case or a typo usually keep the fingerprint.
+    """
+    name = normalize_name(name)
+    if len(name) <= SHINGLE_SIZE:
+        return _hash(name)
+    return min(
+        _hash(name[start:start + SHINGLE_SIZE])
+        for start in range(len(name) - SHINGLE_SIZE + 1)
+    )
+
+
+def ingredients_fingerprint(ingredients):
+    """Hash of the sorted (ingredient id, amount) pairs."""
+    content = ';'.join(
+        f'{ingredient_id}:{amount}'
+        for ingredient_id, amount in sorted(ingredients)
+    )
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def recipe_fingerprint(name, ingredients):
+    """Fingerprint fields of a recipe with (ingredient id, amount) pairs."""
+    return {
+        'ingredients_hash': ingredients_fingerprint(ingredients),
+        'name_hash': name_fingerprint(name),
+    }
+
+
+def _set_fingerprints(recipes):
+    ingredients = defaultdict(list)
+    for recipe_id, ingredient_id, amount in (
+        IngredientAmount.objects.filter(
+            recipe_id__in=[recipe.id for recipe in recipes]
+        ).values_list('recipe_id', 'ingredient_id', 'amount')
+    ):
+        ingredients[recipe_id].append((ingredient_id, amount))
+    for recipe in recipes:
+        for field, value in recipe_fingerprint(
+            recipe.name, ingredients[recipe.id]
+        ).items():
+            setattr(recipe, field, value)
+    Recipe.all_objects.bulk_update(recipes, ('ingredients_hash', 'name_hash'))
+
+
+def update_fingerprints(recipe_ids):
+    """Recompute fingerprints of the recipes from their saved rows.
+
+    For edits outside the API, which computes them from the request.
+    """
+    _set_fingerprints(list(
+        Recipe.all_objects.filter(pk__in=recipe_ids).only('id', 'name')
+    ))
+
+
+def expire_fingerprints(recipes):
+    """Clear fingerprints of the recipes and recompute them in the background.
+
+    For changes to more recipes than a request should update.
+    """
+    recipes.update(ingredients_hash='')
+    enqueue('recipes.backfill_fingerprints', dedup_key='fingerprints')
+
+
+def backfill_fingerprints(batch_size=1000):
+    """Fill fingerprints of recipes saved before they existed.
+
+    Yields the number of updated recipes after every batch.
+    """
+    last_id = 0
+    updated = 0
+    while True:
+        recipes = list(
+            Recipe.objects.filter(id__gt=last_id).filter(
+                Q(ingredients_hash='') | Q(name_hash__isnull=True)
+            ).order_by('id').only('id', 'name')[:batch_size]
+        )
+        if not recipes:
+            return
+        _set_fingerprints(recipes)
+        updated += len(recipes)
+        last_id = recipes[-1].id
+        yield updated
+
+
+def find_duplicate_clusters(same_author=False, batch_size=500):
+    """Yield lists of ids of recipes with equal fingerprints, oldest first.
+
+    Clusters come from one GROUP BY over the fingerprint columns, so
+    recipes are never compared pairwise.
+    """
+    keys = ('ingredients_hash', 'name_hash')
+    if same_author:
+        keys = ('author_id', *keys)
+    clusters = Recipe.objects.exclude(ingredients_hash='').filter(
+        name_hash__isnull=False
+    ).order_by().values_list(*keys).annotate(
+        count=Count('id')
+    ).filter(count__gt=1).iterator()
+    while True:
+        batch = {cluster[:-1] for cluster in islice(clusters, batch_size)}
+        if not batch:
+            return
+        members = defaultdict(list)
+        for recipe in Recipe.objects.filter(
+            ingredients_hash__in={cluster[-2] for cluster in batch}
+        ).order_by('pud_date', 'id').values('id', *keys):
+            key = tuple(recipe[field] for field in keys)
+            if key in batch:
+                members[key].append(recipe['id'])
+        yield from members.values()
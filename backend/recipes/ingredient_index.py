@@ -0,0 +1,135 @@
+import threading
+import time
+import uuid
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .models import IngredientAmount, Recipe
+
+INDEX_VERSION_CACHE_KEY = 'recipes:ingredient-index-version'
+
+
+def _postings(pairs, positions):
+    """Map every key of (key, position) pairs to a sorted position array."""
+    order = np.lexsort((positions, pairs))
+    keys, starts = np.unique(pairs[order], return_index=True)
+    return dict(zip(
+        keys.tolist(), np.split(positions[order].astype(np.int32), starts[1:])
+    ))
+
+
+class IngredientIndex:
+    """In-memory inverted index from ingredients and tags to recipes."""
+
+    def __init__(self, ingredient_pairs, tag_pairs):
+        self.recipe_ids = np.unique(ingredient_pairs[:, 0])
+        positions = np.searchsorted(self.recipe_ids, ingredient_pairs[:, 0])
+        self.sizes = np.bincount(positions, minlength=len(self.recipe_ids))
+        self.ingredients = _postings(ingredient_pairs[:, 1], positions)
+        tag_pairs = tag_pairs[np.isin(tag_pairs[:, 0], self.recipe_ids)]
+        self.tags = _postings(
+            tag_pairs[:, 1], np.searchsorted(self.recipe_ids, tag_pairs[:, 0])
+        )
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def build(cls):
+        ingredient_pairs = np.array(
+            IngredientAmount.objects.filter(
+                recipe__deleted_at__isnull=True
+            ).values_list('recipe_id', 'ingredient_id'),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        tag_pairs = np.array(
+            Recipe.tags.through.objects.values_list('recipe_id', 'tag_id'),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        return cls(ingredient_pairs, tag_pairs)
+
+    def search(self, ingredient_ids, min_match=1, tag_ids=None, limit=20):
+        """Return ids of recipes with at least min_match of the ingredients.
+
+        Recipes are ranked by the share of their ingredients that are
+        covered, then by the number of matched ingredients.
+        """
+        postings = [
+            self.ingredients[ingredient_id]
+            for ingredient_id in set(ingredient_ids)
+            if ingredient_id in self.ingredients
+        ]
+        if not postings:
+            return []
+        matched = np.bincount(
+            np.concatenate(postings), minlength=len(self.recipe_ids)
+        )
+        candidates = np.flatnonzero(matched >= min_match)
+        if tag_ids is not None:
+            tagged = [self.tags[tag_id] for tag_id in tag_ids
+                      if tag_id in self.tags]
+            if not tagged:
+                return []
+            candidates = np.intersect1d(
+                candidates, np.concatenate(tagged), assume_unique=False
+            )
+        matched = matched[candidates]
+        coverage = matched / self.sizes[candidates]
+        order = np.lexsort((-matched, -coverage))[:limit]
+        return self.recipe_ids[candidates[order]].tolist()
+
+
+_index = None
+_index_version = None
+_lock = threading.Lock()
+
+
+def _rebuild(version):
+    global _index, _index_version
+    try:
+        _index = IngredientIndex.build()
+        _index_version = version
+    finally:
+        connections.close_all()
+        _lock.release()
+
+
+def get_ingredient_index():
+    """Return the process-wide index, rebuilding it when it is stale.
+
+    The index is rebuilt when another process has marked it changed, but
+    not more often than every INGREDIENT_INDEX_MIN_AGE seconds, and at
+    least every INGREDIENT_INDEX_MAX_AGE seconds. Only the first index is
+    built in the request; a stale one is served while a background thread
+    builds the next.
+    """
+    global _index, _index_version
+    version = cache.get(INDEX_VERSION_CACHE_KEY)
+    index = _index
+    if index is not None:
+        age = time.monotonic() - index.built_at
+        if age < settings.INGREDIENT_INDEX_MIN_AGE or (
+            version == _index_version
+            and age < settings.INGREDIENT_INDEX_MAX_AGE
+        ):
+            return index
+    if not _lock.acquire(blocking=index is None):
+        return index
+    if index is not None:
+        threading.Thread(
+            target=_rebuild, args=(version,), daemon=True,
+            name='ingredient-index',
+        ).start()
+        return index
+    try:
+        if _index is None:
+            _index = IngredientIndex.build()
+            _index_version = version
+        return _index
+    finally:
+        _lock.release()
+
+
+def mark_ingredient_index_changed():
+    cache.set(INDEX_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
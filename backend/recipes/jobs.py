@@ -0,0 +1,32 @@
+from .feed import backfill_feed, fan_out_recipe
+from .fingerprint import backfill_fingerprints
+from .media import release_image
+from .popularity import rebuild_tag_boards
+from .purge import run_purge
+from .similarity import update_similar_recipes
+from .snapshot import publish_ingredient_snapshot
+from jobs.registry import job
+
+job('recipes.fan_out_recipe')(fan_out_recipe)
+job('recipes.backfill_feed')(backfill_feed)
+job('recipes.release_image')(release_image)
+job('recipes.purge')(run_purge)
+job('recipes.rebuild_tag_boards')(rebuild_tag_boards)
+
+
+@job('recipes.update_similar_recipes', batch_size=50)
+def update_similar(payloads):
+    for recipe_id in sorted({payload['recipe_id'] for payload in payloads}):
+        update_similar_recipes(recipe_id)
+
+
+@job('recipes.publish_ingredients', batch_size=100)
+def publish_ingredients(payloads):
+    # However many changes were queued, one snapshot covers them all.
+    publish_ingredient_snapshot()
+
+
+@job('recipes.backfill_fingerprints')
+def refresh_fingerprints():
+    for _ in backfill_fingerprints():
+        pass
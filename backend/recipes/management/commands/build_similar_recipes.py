@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import build_similar_recipes
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает похожие рецепты по общим ингредиентам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k', type=int, default=settings.SIMILAR_RECIPES_COUNT
+        )
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        processed = 0
+        for count in build_similar_recipes(
+            options['top_k'], options['chunk_size']
+        ):
+            processed += count
+            self.stdout.write(f'Обработано рецептов: {processed}')
+        self.stdout.write(self.style.SUCCESS('Похожие рецепты пересчитаны'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipes.media import collect_media_garbage
+
+
+class Command(BaseCommand):
+    help = 'Удаляет изображения рецептов, на которые нет ссылок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать файлы, ничего не удаляя'
+        )
+
+    def handle(self, *args, **options):
+        checked = deleted = 0
+        for checked, deleted in collect_media_garbage(
+            options['batch_size'], options['dry_run']
+        ):
+            self.stdout.write(f'Проверено {checked}, к удалению {deleted}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: проверено {checked}, удалено {deleted}'
+        ))
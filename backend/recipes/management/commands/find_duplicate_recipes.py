@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from recipes.fingerprint import backfill_fingerprints, find_duplicate_clusters
+
+
+class Command(BaseCommand):
+    help = 'Находит группы одинаковых рецептов по отпечаткам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='Сначала посчитать отпечатки старых рецептов'
+        )
+        parser.add_argument(
+            '--same-author', action='store_true',
+            help='Искать только повторы одного автора'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            for count in backfill_fingerprints(options['batch_size']):
+                self.stdout.write(f'Отпечатки посчитаны для {count}')
+        clusters = duplicates = 0
+        for recipe_ids in find_duplicate_clusters(
+            options['same_author'], options['batch_size']
+        ):
+            clusters += 1
+            duplicates += len(recipe_ids) - 1
+            self.stdout.write(' '.join(map(str, recipe_ids)))
+        self.stdout.write(self.style.SUCCESS(
+            f'Групп: {clusters}, лишних рецептов: {duplicates}'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from recipes.snapshot import publish_ingredient_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Публикует снимок списка ингредиентов в статике'
+
+    def handle(self, *args, **options):
+        manifest = publish_ingredient_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f'Опубликована версия {manifest["version"]}: {manifest["url"]}'
+        ))
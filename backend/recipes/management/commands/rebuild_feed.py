@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from recipes.feed import backfill_feed, get_celebrity_ids
+from users.models import Follow
+
+
+class Command(BaseCommand):
+    help = 'Заполняет ленты подписок по существующим подпискам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        celebrity_ids = get_celebrity_ids()
+        follows = Follow.objects.exclude(
+            author_id__in=celebrity_ids
+        ).order_by('id')
+        last_id = 0
+        processed = 0
+        while True:
+            batch = list(
+                follows.filter(id__gt=last_id)
+                .values_list('id', 'user_id', 'author_id')
+                [:options['batch_size']]
+            )
+            if not batch:
+                break
+            for _, user_id, author_id in batch:
+                backfill_feed(user_id, author_id)
+            last_id = batch[-1][0]
+            processed += len(batch)
+            self.stdout.write(f'Обработано подписок: {processed}')
+        self.stdout.write(self.style.SUCCESS('Ленты подписок заполнены'))
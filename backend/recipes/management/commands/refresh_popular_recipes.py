@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipes.popularity import refresh_popular_recipes
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновляет рейтинги популярных рецептов по активности, '
+        'появившейся с прошлого запуска'
+    )
+
+    def handle(self, *args, **options):
+        for window, count in refresh_popular_recipes():
+            self.stdout.write(f'{window}: изменено оценок {count}')
+        self.stdout.write(self.style.SUCCESS('Рейтинги обновлены'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from recipes.digest import get_run, send_digest
+
+
+class Command(BaseCommand):
+    help = (
+        'Рассылает подписчикам письма с новыми рецептами авторов, '
+        'на которых они подписаны; продолжает прерванную рассылку'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int,
+            help='Подписчиков за один шаг (по умолчанию DIGEST_CHUNK_SIZE)',
+        )
+
+    def handle(self, *args, **options):
+        run = get_run()
+        if run.last_user_id:
+            self.stdout.write(
+                f'Продолжаем рассылку {run} после подписчика '
+                f'{run.last_user_id}'
+            )
+        total = 0
+        for last_user_id, sent in send_digest(run, options['chunk_size']):
+            self.stdout.write(f'до подписчика {last_user_id}: писем {sent}')
+            total += sent
+        self.stdout.write(self.style.SUCCESS(
+            f'Рассылка {run} завершена, отправлено писем: {total}'
+        ))
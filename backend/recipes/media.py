@@ -0,0 +1,74 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .models import Recipe
+
+
+def _is_recent(name, now):
+    try:
+        modified = os.path.getmtime(default_storage.path(name))
+    except FileNotFoundError:
+        return True
+    return now - modified < settings.MEDIA_GC_GRACE_SECONDS
+
+
+def release_image(name):
+    """Delete a recipe image unless another recipe still uses it.
+
+    Files touched within the grace period may be in use by an upload that
+    isn't committed yet; they are left to collect_media_garbage.
+    """
+    if not name or Recipe.objects.filter(image=name).exists():
+        return False
+    if _is_recent(name, time.time()):
+        return False
+    default_storage.delete(name)
+    return True
+
+
+def _iter_files(directory):
+    directories, files = default_storage.listdir(directory)
+    for file in files:
+        yield os.path.join(directory, file)
+    for subdirectory in directories:
+        yield from _iter_files(os.path.join(directory, subdirectory))
+
+
+def _batches(names, size):
+    batch = []
+    for name in names:
+        batch.append(name)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def collect_media_garbage(batch_size=1000, dry_run=False):
+    """Delete recipe images that no recipe references.
+
+    Yields (checked, deleted) counters after every batch.
+    """
+    directory = Recipe._meta.get_field('image').upload_to.rstrip('/')
+    if not default_storage.exists(directory):
+        return
+    now = time.time()
+    checked = deleted = 0
+    for batch in _batches(_iter_files(directory), batch_size):
+        used = set(
+            Recipe.objects.filter(image__in=batch).values_list(
+                'image', flat=True
+            )
+        )
+        for name in batch:
+            if name in used or _is_recent(name, now):
+                continue
+            if not dry_run:
+                default_storage.delete(name)
+            deleted += 1
+        checked += len(batch)
+        yield checked, deleted
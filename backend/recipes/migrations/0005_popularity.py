@@ -0,0 +1,54 @@
+# Generated by Django 2.2.19 on 2026-10-19 09:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeActivity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('favorites', models.PositiveIntegerField(default=0, verbose_name='Добавлений в избранное')),
+                ('shopping_carts', models.PositiveIntegerField(default=0, verbose_name='Добавлений в список покупок')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='recipes.Recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Активность по рецепту',
+                'verbose_name_plural': 'Активность по рецептам',
+            },
+        ),
+        migrations.CreateModel(
+            name='PopularRecipe',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('day', 'За сутки'), ('week', 'За неделю'), ('all', 'За всё время')], max_length=4, verbose_name='Период')),
+                ('score', models.PositiveIntegerField(verbose_name='Популярность')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='popularity', to='recipes.Recipe', verbose_name='Рецепт')),
+                ('tag', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.Tag', verbose_name='Тэг')),
+            ],
+            options={
+                'verbose_name': 'Популярный рецепт',
+                'verbose_name_plural': 'Популярные рецепты',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipeactivity',
+            index=models.Index(fields=['hour'], name='recipe_activity_hour_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipeactivity',
+            constraint=models.UniqueConstraint(fields=('recipe', 'hour'), name='unique_recipe_activity_hour'),
+        ),
+        migrations.AddIndex(
+            model_name='popularrecipe',
+            index=models.Index(fields=['window', 'tag', '-score'], name='popular_recipe_score_idx'),
+        ),
+    ]
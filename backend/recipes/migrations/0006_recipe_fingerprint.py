@@ -0,0 +1,27 @@
+# Generated by Django 2.2.19 on 2026-10-19 10:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredients_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40, verbose_name='Отпечаток ингредиентов'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='name_hash',
+            field=models.BigIntegerField(editable=False, null=True, verbose_name='Отпечаток названия'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', 'ingredients_hash', 'name_hash'], name='recipe_fingerprint_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 2.2.19 on 2026-10-19 10:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0007_purge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Название')),
+                ('position', models.DateTimeField(blank=True, null=True, verbose_name='Обработано до')),
+            ],
+            options={
+                'verbose_name': 'Контрольная точка',
+                'verbose_name_plural': 'Контрольные точки',
+            },
+        ),
+        migrations.AddField(
+            model_name='favoriterecipe',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, null=True, verbose_name='Добавлен'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, null=True, verbose_name='Добавлен'),
+        ),
+        migrations.CreateModel(
+            name='RecipeDailyStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('favorites', models.PositiveIntegerField(default=0, verbose_name='Добавлений в избранное')),
+                ('shopping_carts', models.PositiveIntegerField(default=0, verbose_name='Добавлений в список покупок')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='recipes.Recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Статистика рецепта за день',
+                'verbose_name_plural': 'Статистика рецептов по дням',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipedailystats',
+            index=models.Index(fields=['author', 'day'], name='daily_stats_author_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipedailystats',
+            constraint=models.UniqueConstraint(fields=('recipe', 'day'), name='unique_recipe_daily_stats'),
+        ),
+    ]
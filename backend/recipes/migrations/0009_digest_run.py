@@ -0,0 +1,30 @@
+# Generated by Django 2.2.19 on 2026-10-19 10:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigestRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('since', models.DateTimeField(verbose_name='Рецепты с')),
+                ('until', models.DateTimeField(verbose_name='Рецепты до')),
+                ('last_user_id', models.BigIntegerField(default=0, verbose_name='Обработаны подписчики до ID')),
+                ('sent', models.PositiveIntegerField(default=0, verbose_name='Отправлено писем')),
+                ('started', models.DateTimeField(auto_now_add=True, verbose_name='Начато')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+            ],
+            options={
+                'verbose_name': 'Рассылка подборки',
+                'verbose_name_plural': 'Рассылки подборок',
+                'ordering': ['-id'],
+            },
+        ),
+    ]
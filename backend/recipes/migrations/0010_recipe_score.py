@@ -0,0 +1,35 @@
+# Generated by Django 2.2.19 on 2026-10-19 10:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_digest_run'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeScore',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('day', 'За сутки'), ('week', 'За неделю'), ('all', 'За всё время')], max_length=4, verbose_name='Период')),
+                ('score', models.PositiveIntegerField(verbose_name='Популярность')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.Recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Популярность рецепта',
+                'verbose_name_plural': 'Популярность рецептов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipescore',
+            index=models.Index(fields=['window', '-score'], name='recipe_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipescore',
+            constraint=models.UniqueConstraint(fields=('window', 'recipe'), name='unique_recipe_score_window'),
+        ),
+    ]
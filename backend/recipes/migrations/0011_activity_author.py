@@ -0,0 +1,50 @@
+# Generated by Django 2.2.19 on 2026-10-19 10:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def set_activity_authors(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeActivity = apps.get_model('recipes', 'RecipeActivity')
+    RecipeActivity.objects.update(author_id=models.Subquery(
+        Recipe._base_manager.filter(
+            pk=models.OuterRef('recipe_id')
+        ).values('author_id')[:1]
+    ))
+
+
+def remove_stats_checkpoint(apps, schema_editor):
+    RollupCheckpoint = apps.get_model('recipes', 'RollupCheckpoint')
+    RollupCheckpoint.objects.filter(name='recipe_daily_stats').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0010_recipe_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipeactivity',
+            name='author',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта'),
+        ),
+        migrations.RunPython(set_activity_authors, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='recipeactivity',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта'),
+        ),
+        migrations.AddIndex(
+            model_name='recipeactivity',
+            index=models.Index(fields=['author', 'hour'], name='recipe_activity_author_idx'),
+        ),
+        migrations.DeleteModel(
+            name='RecipeDailyStats',
+        ),
+        migrations.RunPython(remove_stats_checkpoint, migrations.RunPython.noop),
+    ]
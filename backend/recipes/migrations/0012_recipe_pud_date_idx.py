@@ -0,0 +1,17 @@
+# Generated by Django 2.2.19 on 2026-10-19 10:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_activity_author'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pud_date'], name='recipe_pud_date_idx'),
+        ),
+    ]
@@ -53,6 +53,13 @@ class Ingredient(models.Model):
         return f'{self.name}, {self.measurement_unit}.'
 
 
+class RecipeManager(models.Manager):
+    """Hides recipes that are deleted but not purged yet."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -93,11 +100,42 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    ingredients_hash = models.CharField(
+        verbose_name='Отпечаток ингредиентов',
+        max_length=40,
+        blank=True,
+        editable=False,
+    )
+    name_hash = models.BigIntegerField(
+        verbose_name='Отпечаток названия',
+        null=True,
+        editable=False,
+    )
+    deleted_at = models.DateTimeField(
+        verbose_name='Удалён',
+        null=True,
+        blank=True,
+        editable=False,
+    )
+
+    objects = RecipeManager()
+    all_objects = models.Manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pud_date']
+        indexes = [
+            models.Index(fields=['-pud_date'], name='recipe_pud_date_idx'),
+            models.Index(
+                fields=['author', '-pud_date'],
+                name='recipe_author_date_idx',
+            ),
+            models.Index(
+                fields=['author', 'ingredients_hash', 'name_hash'],
+                name='recipe_fingerprint_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -140,6 +178,12 @@ class FavoriteRecipe(models.Model):
         related_name='favorites',
         verbose_name='Рецепт',
     )
+    created = models.DateTimeField(
+        verbose_name='Добавлен',
+        auto_now_add=True,
+        null=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Избранный рецепт'
@@ -166,6 +210,12 @@ class ShoppingCart(models.Model):
         related_name='list',
         verbose_name='Рецепт',
     )
+    created = models.DateTimeField(
+        verbose_name='Добавлен',
+        auto_now_add=True,
+        null=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Корзина'
@@ -176,3 +226,296 @@ class ShoppingCart(models.Model):
                 name='unique_user_list'
             )
         ]
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_user_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx',
+            ),
+        ]
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score_idx',
+            ),
+        ]
+
+
+class RecipeActivity(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='activity',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта',
+    )
+    hour = models.DateTimeField(verbose_name='Час')
+    favorites = models.PositiveIntegerField(
+        verbose_name='Добавлений в избранное',
+        default=0,
+    )
+    shopping_carts = models.PositiveIntegerField(
+        verbose_name='Добавлений в список покупок',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Активность по рецепту'
+        verbose_name_plural = 'Активность по рецептам'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'hour'],
+                name='unique_recipe_activity_hour'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['hour'], name='recipe_activity_hour_idx'),
+            models.Index(
+                fields=['author', 'hour'], name='recipe_activity_author_idx'
+            ),
+        ]
+
+
+class PopularRecipe(models.Model):
+    DAY = 'day'
+    WEEK = 'week'
+    ALL_TIME = 'all'
+    WINDOW_CHOICES = (
+        (DAY, 'За сутки'),
+        (WEEK, 'За неделю'),
+        (ALL_TIME, 'За всё время'),
+    )
+
+    window = models.CharField(
+        verbose_name='Период',
+        max_length=4,
+        choices=WINDOW_CHOICES,
+    )
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Тэг',
+        blank=True,
+        null=True,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='popularity',
+        verbose_name='Рецепт',
+    )
+    score = models.PositiveIntegerField(verbose_name='Популярность')
+
+    class Meta:
+        verbose_name = 'Популярный рецепт'
+        verbose_name_plural = 'Популярные рецепты'
+        indexes = [
+            models.Index(
+                fields=['window', 'tag', '-score'],
+                name='popular_recipe_score_idx',
+            ),
+        ]
+
+
+class RecipeScore(models.Model):
+    window = models.CharField(
+        verbose_name='Период',
+        max_length=4,
+        choices=PopularRecipe.WINDOW_CHOICES,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт',
+    )
+    score = models.PositiveIntegerField(verbose_name='Популярность')
+
+    class Meta:
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['window', 'recipe'],
+                name='unique_recipe_score_window'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['window', '-score'],
+                name='recipe_score_idx',
+            ),
+        ]
+
+
+class RollupCheckpoint(models.Model):
+    name = models.CharField(
+        verbose_name='Название',
+        max_length=50,
+        unique=True,
+    )
+    position = models.DateTimeField(
+        verbose_name='Обработано до',
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = 'Контрольная точка'
+        verbose_name_plural = 'Контрольные точки'
+
+    def __str__(self):
+        return self.name
+
+
+class PurgeTask(models.Model):
+    RECIPE = 'recipe'
+    USER = 'user'
+    KIND_CHOICES = (
+        (RECIPE, 'Рецепт'),
+        (USER, 'Пользователь'),
+    )
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Завершено'),
+    )
+
+    kind = models.CharField(
+        verbose_name='Что удаляется',
+        max_length=10,
+        choices=KIND_CHOICES,
+    )
+    object_id = models.BigIntegerField(verbose_name='ID объекта')
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+    )
+    stage = models.CharField(
+        verbose_name='Этап',
+        max_length=100,
+        blank=True,
+    )
+    deleted_rows = models.PositiveIntegerField(
+        verbose_name='Удалено строк',
+        default=0,
+    )
+    created = models.DateTimeField(
+        verbose_name='Создано',
+        auto_now_add=True,
+    )
+    finished = models.DateTimeField(
+        verbose_name='Завершено',
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = 'Удаление'
+        verbose_name_plural = 'Удаления'
+        ordering = ['-id']
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.object_id}'
+
+
+class DigestRun(models.Model):
+    since = models.DateTimeField(verbose_name='Рецепты с')
+    until = models.DateTimeField(verbose_name='Рецепты до')
+    last_user_id = models.BigIntegerField(
+        verbose_name='Обработаны подписчики до ID',
+        default=0,
+    )
+    sent = models.PositiveIntegerField(
+        verbose_name='Отправлено писем',
+        default=0,
+    )
+    started = models.DateTimeField(
+        verbose_name='Начато',
+        auto_now_add=True,
+    )
+    finished = models.DateTimeField(
+        verbose_name='Завершено',
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = 'Рассылка подборки'
+        verbose_name_plural = 'Рассылки подборок'
+        ordering = ['-id']
+
+    def __str__(self):
+        return f'{self.since:%d.%m.%Y} – {self.until:%d.%m.%Y}'
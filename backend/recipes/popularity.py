@@ -0,0 +1,250 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import (FavoriteRecipe, PopularRecipe, Recipe, RecipeActivity,
+                     RecipeScore, RollupCheckpoint, ShoppingCart)
+
+WINDOWS = {
+    PopularRecipe.DAY: timedelta(days=1),
+    PopularRecipe.WEEK: timedelta(days=7),
+    PopularRecipe.ALL_TIME: None,
+}
+# Hourly buckets older than this, counted from the checkpoint, are merged
+# into daily ones. It must not be shorter than the longest window: scores
+# lose the buckets that leave a window by their hour.
+HOURLY_BUCKETS_AGE = timedelta(days=7)
+# Hours before the checkpoint that are counted again on every run: rows
+# of a transaction still open at the previous run show up under them.
+RECOUNT_AGE = timedelta(hours=1)
+CHECKPOINT = 'recipe_popularity'
+# Recipes per query when scores are updated.
+SCORES_BATCH_SIZE = 1000
+
+
+def _source_buckets(since, until):
+    """Favorites and shopping list additions per recipe and hour."""
+    buckets = {}
+    for model, field in (
+        (FavoriteRecipe, 'favorites'), (ShoppingCart, 'shopping_carts')
+    ):
+        rows = model.objects.filter(created__lt=until)
+        if since is not None:
+            rows = rows.filter(created__gte=since)
+        for recipe_id, author_id, hour, count in (
+            rows.annotate(hour=TruncHour('created'))
+            .values('recipe_id', 'recipe__author_id', 'hour')
+            .annotate(count=Count('id'))
+            .order_by()
+            .values_list('recipe_id', 'recipe__author_id', 'hour', 'count')
+        ):
+            bucket = buckets.setdefault((recipe_id, hour), RecipeActivity(
+                recipe_id=recipe_id, author_id=author_id, hour=hour
+            ))
+            setattr(bucket, field, count)
+    return buckets
+
+
+def rollup_activity(since, until):
+    """Rewrite the buckets of [since, until) from favorites and lists.
+
+    Returns how the total of every bucket changed, by recipe and hour.
+    """
+    buckets = RecipeActivity.objects.filter(hour__lt=until)
+    if since is not None:
+        buckets = buckets.filter(hour__gte=since)
+    old = {
+        (recipe_id, hour): favorites + shopping_carts
+        for recipe_id, hour, favorites, shopping_carts in buckets.values_list(
+            'recipe_id', 'hour', 'favorites', 'shopping_carts'
+        )
+    }
+    new = _source_buckets(since, until)
+    buckets.delete()
+    RecipeActivity.objects.bulk_create(
+        new.values(), batch_size=SCORES_BATCH_SIZE
+    )
+    changes = {}
+    for key in old.keys() | new.keys():
+        bucket = new.get(key)
+        total = bucket.favorites + bucket.shopping_carts if bucket else 0
+        if total != old.get(key, 0):
+            changes[key] = total - old.get(key, 0)
+    return changes
+
+
+def compact_activity(before):
+    """Merge hourly buckets older than before into their day's bucket."""
+    old = RecipeActivity.objects.filter(hour__lt=before).exclude(
+        hour__hour=0
+    )
+    days = (
+        old.annotate(day=TruncDay('hour'))
+        .values('recipe_id', 'author_id', 'day')
+        .annotate(
+            total_favorites=Sum('favorites'),
+            total_shopping_carts=Sum('shopping_carts'),
+        )
+        .order_by()
+    )
+    for day in days:
+        updated = RecipeActivity.objects.filter(
+            recipe_id=day['recipe_id'], hour=day['day']
+        ).update(
+            favorites=F('favorites') + day['total_favorites'],
+            shopping_carts=F('shopping_carts') + day['total_shopping_carts'],
+        )
+        if not updated:
+            RecipeActivity.objects.create(
+                recipe_id=day['recipe_id'],
+                author_id=day['author_id'],
+                hour=day['day'],
+                favorites=day['total_favorites'],
+                shopping_carts=day['total_shopping_carts'],
+            )
+    old.delete()
+
+
+def _bucket_totals(since, until):
+    """Activity per recipe in the buckets of [since, until)."""
+    activity = RecipeActivity.objects.filter(hour__lt=until)
+    if since is not None:
+        activity = activity.filter(hour__gte=since)
+    return dict(
+        activity.values('recipe_id')
+        .annotate(total=Sum(F('favorites') + F('shopping_carts')))
+        .order_by()
+        .values_list('recipe_id', 'total')
+    )
+
+
+def _score_changes(length, previous, until):
+    """Score changes of a window moved from ending at previous to until.
+
+    Buckets that entered the window are added, buckets that left it are
+    subtracted; the all-time window only gains.
+    """
+    if length is None:
+        return _bucket_totals(previous, until)
+    start = until - length
+    if previous is None:
+        return _bucket_totals(start, until)
+    changes = _bucket_totals(max(previous, start), until)
+    left = _bucket_totals(previous - length, min(previous, start))
+    for recipe_id, total in left.items():
+        changes[recipe_id] = changes.get(recipe_id, 0) - total
+    return {
+        recipe_id: change for recipe_id, change in changes.items() if change
+    }
+
+
+def _apply_changes(window, changes):
+    """Add the changes to the window's scores; return tags of the recipes."""
+    recipe_ids, tag_ids = list(changes), set()
+    for index in range(0, len(recipe_ids), SCORES_BATCH_SIZE):
+        batch = recipe_ids[index:index + SCORES_BATCH_SIZE]
+        updated, emptied = [], []
+        for score in RecipeScore.objects.filter(
+            window=window, recipe_id__in=batch
+        ):
+            score.score += changes[score.recipe_id]
+            (updated if score.score > 0 else emptied).append(score)
+        RecipeScore.objects.bulk_update(updated, ('score',))
+        RecipeScore.objects.filter(
+            pk__in=[score.pk for score in emptied]
+        ).delete()
+        existing = {score.recipe_id for score in updated + emptied}
+        RecipeScore.objects.bulk_create(
+            RecipeScore(window=window, recipe_id=recipe_id,
+                        score=changes[recipe_id])
+            for recipe_id in batch
+            if recipe_id not in existing and changes[recipe_id] > 0
+        )
+        tag_ids.update(Recipe.tags.through.objects.filter(
+            recipe_id__in=batch
+        ).values_list('tag_id', flat=True))
+    return tag_ids
+
+
+def _rebuild_board(window, tag_id):
+    scores = RecipeScore.objects.filter(window=window)
+    if tag_id is not None:
+        scores = scores.filter(recipe__tags=tag_id)
+    top = scores.order_by('-score', '-recipe_id').values_list(
+        'recipe_id', 'score'
+    )[:settings.POPULAR_RECIPES_COUNT]
+    PopularRecipe.objects.filter(window=window, tag_id=tag_id).delete()
+    return len(PopularRecipe.objects.bulk_create(
+        PopularRecipe(window=window, tag_id=tag_id, recipe_id=recipe_id,
+                      score=score)
+        for recipe_id, score in top
+    ))
+
+
+def rebuild_tag_boards(tag_id):
+    """Rebuild the tag's leaderboards after its recipes were changed."""
+    RollupCheckpoint.objects.get_or_create(name=CHECKPOINT)
+    with transaction.atomic():
+        # Taken by refresh_popular_recipes while it rebuilds boards.
+        RollupCheckpoint.objects.select_for_update().get(name=CHECKPOINT)
+        for window in WINDOWS:
+            _rebuild_board(window, tag_id)
+
+
+def refresh_popular_recipes(now=None):
+    """Roll activity up to the last complete hour and update leaderboards.
+
+    Hourly buckets are counted from the favorites and shopping lists
+    added since the checkpoint, and RECOUNT_AGE before it for rows that
+    were committed late. Per-recipe scores of every window are kept in
+    RecipeScore and only changed by the buckets that entered or left the
+    window, or were recounted. Only the leaderboards of windows that
+    changed are rebuilt, and per tag only for the tags of the recipes
+    whose score changed. The current hour, and the POPULAR_RECIPES_LAG
+    seconds before it, are left for the next run. Yields every window and
+    its changed scores.
+    """
+    now = now or timezone.now()
+    until = (
+        now - timedelta(seconds=settings.POPULAR_RECIPES_LAG)
+    ).replace(minute=0, second=0, microsecond=0)
+    RollupCheckpoint.objects.get_or_create(name=CHECKPOINT)
+    with transaction.atomic():
+        checkpoint = RollupCheckpoint.objects.select_for_update().get(
+            name=CHECKPOINT
+        )
+        previous = checkpoint.position
+        if previous is not None and previous >= until:
+            return
+        recounted = rollup_activity(
+            previous and previous - RECOUNT_AGE, until
+        )
+        changed = {}
+        for window, length in WINDOWS.items():
+            changes = _score_changes(length, previous, until)
+            # Recounted buckets the scores already had; newer ones are
+            # added by _score_changes.
+            for (recipe_id, hour), change in recounted.items():
+                if previous is None or hour >= previous:
+                    continue
+                if length is None or hour >= previous - length:
+                    changes[recipe_id] = changes.get(recipe_id, 0) + change
+            changed[window] = {
+                recipe_id: change
+                for recipe_id, change in changes.items() if change
+            }
+        for window, changes in changed.items():
+            if not changes:
+                continue
+            tag_ids = _apply_changes(window, changes)
+            for tag_id in [None, *tag_ids]:
+                _rebuild_board(window, tag_id)
+        checkpoint.position = until
+        checkpoint.save(update_fields=('position',))
+        compact_activity(until - HOURLY_BUCKETS_AGE)
+    for window, changes in changed.items():
+        yield window, len(changes)
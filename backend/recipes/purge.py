@@ -0,0 +1,159 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .ingredient_index import mark_ingredient_index_changed
+from .models import (FavoriteRecipe, FeedEntry, IngredientAmount,
+                     PopularRecipe, PurgeTask, Recipe, RecipeActivity,
+                     RecipeScore, ShoppingCart, SimilarRecipe)
+from jobs.queue import enqueue
+from users.models import Follow, User
+
+# Rows that reference recipes or users, as (model, foreign key) pairs.
+RECIPE_DEPENDENTS = (
+    (IngredientAmount, 'recipe'),
+    (Recipe.tags.through, 'recipe'),
+    (FavoriteRecipe, 'recipe'),
+    (ShoppingCart, 'recipe'),
+    (FeedEntry, 'recipe'),
+    (SimilarRecipe, 'recipe'),
+    (SimilarRecipe, 'similar'),
+    (RecipeActivity, 'recipe'),
+    (RecipeScore, 'recipe'),
+    (PopularRecipe, 'recipe'),
+)
+USER_DEPENDENTS = (
+    (FavoriteRecipe, 'user'),
+    (ShoppingCart, 'user'),
+    (FeedEntry, 'user'),
+    (FeedEntry, 'author'),
+    (Follow, 'user'),
+    (Follow, 'author'),
+)
+
+
+def _schedule_purge(kind, object_id):
+    # Hidden recipes leave the search index without waiting for the purge.
+    transaction.on_commit(mark_ingredient_index_changed)
+    task = PurgeTask.objects.create(kind=kind, object_id=object_id)
+    enqueue('recipes.purge', {'task_id': task.id})
+    return task
+
+
+@transaction.atomic
+def soft_delete_recipe(recipe):
+    """Hide the recipe at once and purge it in the background."""
+    Recipe.all_objects.filter(pk=recipe.pk).update(deleted_at=timezone.now())
+    return _schedule_purge(PurgeTask.RECIPE, recipe.pk)
+
+
+@transaction.atomic
+def soft_delete_user(user):
+    """Deactivate the user, hide their recipes and purge them later."""
+    now = timezone.now()
+    User.objects.filter(pk=user.pk).update(is_active=False, deleted_at=now)
+    Recipe.objects.filter(author_id=user.pk).update(deleted_at=now)
+    return _schedule_purge(PurgeTask.USER, user.pk)
+
+
+def soft_delete_recipes(queryset):
+    """Hide the recipes of the queryset in chunks; return how many.
+
+    Each chunk of PURGE_BATCH_SIZE recipes is hidden with one UPDATE and
+    gets its purge tasks in the same transaction.
+    """
+    ids = queryset.order_by().values_list('pk', flat=True)
+    hidden = 0
+    last_id = 0
+    while True:
+        chunk = list(ids.filter(pk__gt=last_id).order_by('pk')[
+            :settings.PURGE_BATCH_SIZE
+        ])
+        if not chunk:
+            return hidden
+        with transaction.atomic():
+            Recipe.all_objects.filter(pk__in=chunk).update(
+                deleted_at=timezone.now()
+            )
+            tasks = PurgeTask.objects.bulk_create(
+                PurgeTask(kind=PurgeTask.RECIPE, object_id=pk)
+                for pk in chunk
+            )
+            if tasks[0].pk is None:
+                tasks = PurgeTask.objects.filter(
+                    kind=PurgeTask.RECIPE, object_id__in=chunk,
+                    status=PurgeTask.PENDING,
+                )
+            for task in tasks:
+                enqueue('recipes.purge', {'task_id': task.pk})
+        hidden += len(chunk)
+        last_id = chunk[-1]
+
+
+def _set_stage(task, stage):
+    task.stage = stage
+    PurgeTask.objects.filter(pk=task.pk).update(stage=stage)
+
+
+def _delete_in_batches(task, queryset):
+    """Delete rows of the queryset in short transactions of bounded size."""
+    model = queryset.model
+    queryset = queryset.order_by().values_list('pk', flat=True)
+    while True:
+        ids = list(queryset[:settings.PURGE_BATCH_SIZE])
+        if not ids:
+            return
+        deleted, _ = model._base_manager.filter(pk__in=ids).delete()
+        PurgeTask.objects.filter(pk=task.pk).update(
+            deleted_rows=F('deleted_rows') + deleted
+        )
+
+
+def _purge_recipes(task, recipe_ids):
+    for model, field in RECIPE_DEPENDENTS:
+        _delete_in_batches(
+            task, model.objects.filter(**{f'{field}_id__in': recipe_ids})
+        )
+    # Nothing refers to the recipes any more, so the cascade is cheap, and
+    # post_delete handlers (ingredient index, image release) still run.
+    _delete_in_batches(task, Recipe.all_objects.filter(pk__in=recipe_ids))
+
+
+def _purge_user(task):
+    user_id = task.object_id
+    recipes = Recipe.all_objects.filter(author_id=user_id).order_by('id')
+    _set_stage(task, 'recipes')
+    while True:
+        ids = list(recipes.values_list(
+            'id', flat=True
+        )[:settings.PURGE_RECIPES_BATCH_SIZE])
+        if not ids:
+            break
+        _purge_recipes(task, ids)
+    _set_stage(task, 'user')
+    for model, field in USER_DEPENDENTS:
+        _delete_in_batches(
+            task, model.objects.filter(**{f'{field}_id': user_id})
+        )
+    _delete_in_batches(task, User.objects.filter(pk=user_id))
+
+
+def run_purge(task_id):
+    """Delete a hidden recipe or user with everything that refers to it.
+
+    Every batch is committed on its own, so a purge that is interrupted
+    continues where it stopped when the job is retried.
+    """
+    task = PurgeTask.objects.filter(pk=task_id).first()
+    if task is None or task.status == PurgeTask.DONE:
+        return
+    PurgeTask.objects.filter(pk=task.pk).update(status=PurgeTask.RUNNING)
+    if task.kind == PurgeTask.RECIPE:
+        _set_stage(task, 'recipe')
+        _purge_recipes(task, [task.object_id])
+    else:
+        _purge_user(task)
+    PurgeTask.objects.filter(pk=task.pk).update(
+        status=PurgeTask.DONE, stage='', finished=timezone.now()
+    )
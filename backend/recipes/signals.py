@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import clear_tag_ids_cache
+from .ingredient_index import mark_ingredient_index_changed
+from .models import Ingredient, Recipe, Tag
+from jobs.queue import enqueue
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def clear_tag_cache(sender, **kwargs):
+    clear_tag_ids_cache()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def publish_ingredients(sender, raw=False, **kwargs):
+    if not raw:
+        enqueue('recipes.publish_ingredients', dedup_key='snapshot')
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_new_recipe(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        enqueue(
+            'recipes.fan_out_recipe', {'recipe_id': instance.id},
+            dedup_key=str(instance.id)
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def update_ingredient_index(sender, **kwargs):
+    transaction.on_commit(mark_ingredient_index_changed)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(sender, instance, **kwargs):
+    if instance.image:
+        enqueue(
+            'recipes.release_image', {'name': instance.image.name},
+            dedup_key=instance.image.name,
+            delay=settings.MEDIA_GC_GRACE_SECONDS
+        )
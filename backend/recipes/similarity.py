@@ -0,0 +1,132 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from scipy import sparse
+
+from .models import IngredientAmount, SimilarRecipe
+
+# Recipes sharing the most ingredients that are scored on incremental update.
+INCREMENTAL_CANDIDATES = 500
+
+
+def _live_amounts():
+    return IngredientAmount.objects.filter(recipe__deleted_at__isnull=True)
+
+
+def build_ingredient_matrix():
+    """Return recipe ids and a binary recipe x ingredient CSR matrix."""
+    pairs = np.array(
+        _live_amounts().values_list('recipe_id', 'ingredient_id'),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    recipe_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    ingredient_ids, columns = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float32), (rows, columns)),
+        shape=(len(recipe_ids), len(ingredient_ids)),
+    )
+    return recipe_ids, matrix
+
+
+def iter_top_similar(matrix, top_k, chunk_size):
+    """Yield (start, stop, rows, columns, scores) of top_k Jaccard neighbours.
+
+    Rows are processed chunk_size at a time, so only a chunk_size x n
+    sparse block of intersections is in memory at once; start:stop is
+    the range of the chunk, including rows without neighbours.
+    """
+    sizes = np.asarray(matrix.sum(axis=1)).ravel()
+    transposed = matrix.T.tocsr()
+    for start in range(0, matrix.shape[0], chunk_size):
+        stop = min(start + chunk_size, matrix.shape[0])
+        block = (matrix[start:stop] @ transposed).tocoo()
+        rows = block.row + start
+        keep = rows != block.col
+        rows, columns = rows[keep], block.col[keep]
+        shared = block.data[keep]
+        scores = shared / (sizes[rows] + sizes[columns] - shared)
+        order = np.lexsort((-scores, rows))
+        rows, columns, scores = rows[order], columns[order], scores[order]
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        keep = rank < top_k
+        yield start, stop, rows[keep], columns[keep], scores[keep]
+
+
+def build_similar_recipes(top_k, chunk_size):
+    recipe_ids, matrix = build_ingredient_matrix()
+    # Rows of deleted recipes and recipes left without ingredients.
+    live_ids = _live_amounts().values('recipe_id')
+    with transaction.atomic():
+        SimilarRecipe.objects.exclude(
+            recipe_id__in=live_ids, similar_id__in=live_ids
+        ).delete()
+    for start, stop, rows, columns, scores in iter_top_similar(
+        matrix, top_k, chunk_size
+    ):
+        chunk_ids = recipe_ids[start:stop].tolist()
+        with transaction.atomic():
+            SimilarRecipe.objects.filter(recipe_id__in=chunk_ids).delete()
+            SimilarRecipe.objects.bulk_create(
+                SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                              score=score)
+                for recipe_id, similar_id, score in zip(
+                    recipe_ids[rows].tolist(),
+                    recipe_ids[columns].tolist(),
+                    scores.tolist(),
+                )
+            )
+        yield len(chunk_ids)
+
+
+def update_similar_recipes(recipe_id):
+    """Recompute neighbours of one recipe and offer it to theirs."""
+    top_k = settings.SIMILAR_RECIPES_COUNT
+    ingredient_ids = list(
+        IngredientAmount.objects.filter(recipe_id=recipe_id)
+        .values_list('ingredient_id', flat=True)
+    )
+    shared = dict(
+        _live_amounts().filter(ingredient_id__in=ingredient_ids)
+        .exclude(recipe_id=recipe_id)
+        .values('recipe_id')
+        .annotate(shared=Count('id'))
+        .order_by('-shared')
+        .values_list('recipe_id', 'shared')[:INCREMENTAL_CANDIDATES]
+    )
+    sizes = dict(
+        IngredientAmount.objects.filter(recipe_id__in=list(shared))
+        .values('recipe_id')
+        .annotate(size=Count('id'))
+        .values_list('recipe_id', 'size')
+    )
+    scores = sorted(
+        (
+            (count / (len(ingredient_ids) + sizes[other_id] - count),
+             other_id)
+            for other_id, count in shared.items()
+        ),
+        reverse=True,
+    )[:top_k]
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id=recipe_id).delete()
+        SimilarRecipe.objects.filter(similar_id=recipe_id).exclude(
+            recipe_id__in=[other_id for _, other_id in scores]
+        ).delete()
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe_id=recipe_id, similar_id=other_id,
+                          score=score)
+            for score, other_id in scores
+        )
+        for score, other_id in scores:
+            SimilarRecipe.objects.update_or_create(
+                recipe_id=other_id, similar_id=recipe_id,
+                defaults={'score': score},
+            )
+            stale_ids = list(
+                SimilarRecipe.objects.filter(recipe_id=other_id)
+                .order_by('-score')
+                .values_list('id', flat=True)[top_k:]
+            )
+            if stale_ids:
+                SimilarRecipe.objects.filter(id__in=stale_ids).delete()
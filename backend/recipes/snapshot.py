@@ -0,0 +1,108 @@
+import gzip
+import hashlib
+import json
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Ingredient
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SNAPSHOT_CACHE_KEY = 'recipes:ingredient-snapshot'
+SNAPSHOT_CACHE_TIMEOUT = 60
+SNAPSHOT_DIR = 'ingredients'
+MANIFEST_NAME = 'manifest.json'
+# Copy of the current snapshot that nginx serves for /api/ingredients/.
+CURRENT_NAME = 'ingredients.json'
+# Previous snapshots are kept for workers that still advertise them.
+KEEP_SNAPSHOTS = 2
+
+
+def _snapshot_root():
+    return os.path.join(settings.STATIC_ROOT, SNAPSHOT_DIR)
+
+
+def _write(path, content):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+
+
+def _write_compressed(path, content):
+    _write(f'{path}.gz', gzip.compress(content, 9, mtime=0))
+    if brotli is not None:
+        _write(f'{path}.br', brotli.compress(content))
+    _write(path, content)
+
+
+def build_ingredient_snapshot():
+    """Return the ingredient catalog encoded the same way as the API."""
+    ingredients = Ingredient.objects.order_by('name', 'id').values(
+        'id', 'name', 'measurement_unit'
+    )
+    return json.dumps(
+        list(ingredients), ensure_ascii=False, separators=(',', ':')
+    ).encode()
+
+
+def publish_ingredient_snapshot():
+    """Write a versioned, precompressed snapshot into the static volume.
+
+    Files are named after the content hash, so they never change and can be
+    cached forever. Returns the manifest of the published snapshot.
+    """
+    content = build_ingredient_snapshot()
+    version = hashlib.sha256(content).hexdigest()[:16]
+    name = f'ingredients.{version}.json'
+    root = _snapshot_root()
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, name)
+    if not os.path.exists(path):
+        _write_compressed(path, content)
+    _write_compressed(os.path.join(root, CURRENT_NAME), content)
+    manifest = {
+        'version': version,
+        'url': f'{settings.STATIC_URL}{SNAPSHOT_DIR}/{name}',
+    }
+    _write(
+        os.path.join(root, MANIFEST_NAME), json.dumps(manifest).encode()
+    )
+    cache.set(SNAPSHOT_CACHE_KEY, manifest, SNAPSHOT_CACHE_TIMEOUT)
+    _remove_old_snapshots(root, name)
+    return manifest
+
+
+def _remove_old_snapshots(root, current):
+    snapshots = sorted(
+        (entry for entry in os.scandir(root)
+         if entry.name.startswith('ingredients.')
+         and entry.name.endswith('.json')
+         and entry.name not in (current, CURRENT_NAME)),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True,
+    )
+    for entry in snapshots[KEEP_SNAPSHOTS - 1:]:
+        for suffix in ('', '.gz', '.br'):
+            try:
+                os.remove(entry.path + suffix)
+            except FileNotFoundError:
+                pass
+
+
+def get_ingredient_snapshot():
+    """Return the manifest of the current snapshot or None."""
+    manifest = cache.get(SNAPSHOT_CACHE_KEY)
+    if manifest is None:
+        try:
+            with open(os.path.join(_snapshot_root(), MANIFEST_NAME)) as file:
+                manifest = json.load(file)
+        except (OSError, ValueError):
+            return None
+        cache.set(SNAPSHOT_CACHE_KEY, manifest, SNAPSHOT_CACHE_TIMEOUT)
+    return manifest
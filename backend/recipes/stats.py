@@ -0,0 +1,30 @@
+from datetime import datetime, time
+
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import RecipeActivity
+
+
+def get_author_stats(author, since, recipe_id=None):
+    """Daily totals for the author's recipes from the given day on.
+
+    Read by the (author, hour) index from the hourly and daily activity
+    buckets that refresh_popular_recipes rolls up for the leaderboards.
+    """
+    activity = RecipeActivity.objects.filter(
+        author=author,
+        hour__gte=timezone.make_aware(datetime.combine(since, time())),
+    )
+    if recipe_id is not None:
+        activity = activity.filter(recipe_id=recipe_id)
+    return (
+        activity.annotate(day=TruncDate('hour'))
+        .values('day')
+        .annotate(
+            favorites=Sum('favorites'),
+            shopping_carts=Sum('shopping_carts'),
+        )
+        .order_by('day')
+    )
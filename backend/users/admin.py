@@ -1,20 +1,29 @@
 from django.contrib import admin
 
 from .models import Follow, User
+from foodgram.admin import SoftDeleteAdminMixin
+from foodgram.paginator import EstimatedCountPaginator
+from recipes.purge import soft_delete_user
 
 
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'username', 'email', 'first_name', 'last_name')
     search_fields = ('email', 'username', 'first_name', 'last_name')
-    list_filter = ('email', 'username', 'first_name', 'last_name')
+    list_filter = ('is_active', 'is_staff', 'is_superuser')
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    soft_delete = staticmethod(soft_delete_user)
 
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'author')
-    search_fields = ('user', 'author')
-    list_filter = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(User, UserAdmin)
@@ -23,6 +23,12 @@ class User(AbstractUser):
         'Пароль',
         max_length=150
     )
+    deleted_at = models.DateTimeField(
+        'Удалён',
+        null=True,
+        blank=True,
+        editable=False,
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']